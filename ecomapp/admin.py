@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Register,OTP,Profile,Services,Subservices, EmployeeRegistration, ServiceRegistry,ServiceRequest,BookingList,Review,Payment
+from .models import Register,OTP,Profile,Services,Subservices, EmployeeRegistration, ServiceRegistry,ServiceRequest,BookingList,Review,Payment,RatingSummary,EmailOutbox,PaymentEvent
 
 
 
@@ -47,6 +47,12 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'created_at')  # Filters for easy sorting
     search_fields = ('user__name', 'service__title', 'comment')  # Searchable fields
     ordering = ('-created_at',)  # Latest reviews appear first
+
+
+@admin.register(RatingSummary)
+class RatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ('listing', 'review_count', 'average_rating')
+    readonly_fields = ('listing', 'review_count', 'rating_total', 'average_rating', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')
     
     
     
@@ -55,4 +61,22 @@ class ReviewAdmin(admin.ModelAdmin):
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['order_id', 'user', 'employee', 'amount', 'status', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['order_id', 'user__name', 'employee__name']
\ No newline at end of file
+    search_fields = ['order_id', 'user__name', 'employee__name']
+
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['recipient', 'subject']
+    exclude = ['body']  # Holds login OTPs until sent
+
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event', 'order_id', 'status', 'occurred_at', 'processed_at', 'attempts', 'dead_lettered']
+    list_filter = ['event', 'status', 'dead_lettered']
+    search_fields = ['event_id', 'order_id', 'payment_id']
+
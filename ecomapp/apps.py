@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class EcomappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecomapp'
+
+    def ready(self):
+        from .booking import install_overlap_constraint
+        from .search import install_search_index
+        post_migrate.connect(install_overlap_constraint, sender=self)
+        post_migrate.connect(install_search_index, sender=self)
@@ -0,0 +1,78 @@
+import json
+import math
+import re
+import uuid
+
+from .models import EmailOutbox
+
+
+OTP_PATTERN = re.compile(r'\b(\d{6})\b')
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(latencies, queries=None):
+    """p50/p95/p99/mean in milliseconds from latencies in seconds."""
+    samples = sorted(latencies)
+    summary = {
+        'iterations': len(samples),
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+    }
+    if queries is not None:
+        summary['queries'] = max(queries)
+    return summary
+
+
+def load_baseline(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Regressions of `results` against a baseline of the same shape: any
+    endpoint whose p95 grew by more than `tolerance` (a fraction) or that
+    runs more queries than before.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current.get('queries', 0) > previous.get('queries', 0):
+            regressions.append(f"{name}: queries {previous.get('queries')} -> {current['queries']}")
+    return regressions
+
+
+class LocalGateway:
+    """Stands in for Razorpay so order creation never leaves the process."""
+
+    def create_order(self, data):
+        return {'id': f'order_{uuid.uuid4().hex[:14]}', 'entity': 'order', 'amount': data['amount'], 'currency': data['currency'], 'status': 'created'}
+
+    def fetch_order_payments(self, order_id):
+        return {'entity': 'collection', 'count': 0, 'items': []}
+
+    def verify_payment_signature(self, params):
+        return True
+
+    def verify_webhook_signature(self, body, signature, secret):
+        return True
+
+
+def latest_otp(email):
+    """OTP of the newest mail queued for `email`, as the user would read it; bodies are cleared once sent."""
+    body = EmailOutbox.objects.filter(recipient=email).order_by('-id').values_list('body', flat=True).first()
+    match = OTP_PATTERN.search(body or '')
+    return match.group(1) if match else None
@@ -0,0 +1,195 @@
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .cache import AVAILABILITY_TIMEOUT, availability_namespace, namespace_prefix
+from .models import EmployeeRegistration, ServiceRegistry, ServiceRequest
+
+
+logger = logging.getLogger(__name__)
+
+OVERLAP_CONSTRAINT = 'servicerequest_no_overlap'
+
+
+class BookingConflict(Exception):
+    pass
+
+
+def overlapping(queryset, from_time, to_time):
+    """Requests whose [from_time, to_time) window intersects the given one."""
+    return queryset.filter(from_time__lt=to_time, to_time__gt=from_time)
+
+
+def find_conflicts(slots, exclude_pk=None):
+    """
+    Check many (employee_id, from_time, to_time) slots with one range query.
+
+    Returns a list parallel to `slots` holding the ids of the requests each
+    slot collides with; an empty list means the slot is free.
+    """
+    if not slots:
+        return []
+
+    booked = ServiceRequest.objects.filter(employee_id__in={slot[0] for slot in slots})
+    booked = overlapping(booked, min(slot[1] for slot in slots), max(slot[2] for slot in slots))
+    if exclude_pk is not None:
+        booked = booked.exclude(pk=exclude_pk)
+
+    intervals = defaultdict(list)
+    for pk, employee_id, from_time, to_time in booked.order_by('from_time').values_list('pk', 'employee_id', 'from_time', 'to_time'):
+        intervals[employee_id].append((from_time, to_time, pk))
+    starts = {employee_id: [interval[0] for interval in rows] for employee_id, rows in intervals.items()}
+
+    conflicts = []
+    for employee_id, from_time, to_time in slots:
+        rows = intervals.get(employee_id, [])
+        # Only requests starting before the slot ends can overlap it
+        candidates = rows[:bisect_left(starts.get(employee_id, []), to_time)]
+        conflicts.append([pk for start, end, pk in candidates if end > from_time])
+    return conflicts
+
+
+def working_window(day):
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(day, time(settings.AVAILABILITY_DAY_START_HOUR), tzinfo=tz)
+    end = datetime.combine(day, time(settings.AVAILABILITY_DAY_END_HOUR), tzinfo=tz)
+    return start, end
+
+
+def merge_intervals(intervals):
+    """Collapse sorted (start, end) intervals into disjoint ones."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def compute_free_slots(employee_id, days, slot_minutes):
+    """
+    Free slots of a provider for consecutive `days`, from one range query.
+
+    The provider's bookings over the whole range are merged into disjoint
+    busy intervals and swept once against each day's working window; slots
+    start on a grid of `slot_minutes` from the beginning of the window.
+    """
+    slot = timedelta(minutes=slot_minutes)
+    windows = [working_window(day) for day in days]
+    booked = overlapping(ServiceRequest.objects.filter(employee_id=employee_id), windows[0][0], windows[-1][1])
+    busy = merge_intervals(booked.order_by('from_time').values_list('from_time', 'to_time'))
+
+    free = {}
+    index = 0
+    for day, (window_start, window_end) in zip(days, windows):
+        while index < len(busy) and busy[index][1] <= window_start:
+            index += 1
+        slots = []
+        cursor = window_start
+        position = index
+        while cursor < window_end:
+            busy_start, busy_end = busy[position] if position < len(busy) else (window_end, window_end)
+            gap_end = min(busy_start, window_end)
+            # Align the first slot of the gap to the day's grid
+            steps = -((window_start - cursor) // slot)
+            slot_start = window_start + steps * slot
+            while slot_start + slot <= gap_end:
+                slots.append((slot_start, slot_start + slot))
+                slot_start += slot
+            cursor = max(cursor, busy_end)
+            position += 1
+        free[day] = slots
+    return free
+
+
+def free_slots(employee_id, start_date, end_date, slot_minutes):
+    """
+    [(day, slots), ...] for start_date..end_date, cached per provider and day.
+    Any change to the provider's requests moves its cache namespace to a new
+    version, so cached days are never served stale.
+    """
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    prefix = namespace_prefix(availability_namespace(employee_id))
+    keys = {day: f"{prefix}:{day.isoformat()}:{slot_minutes}" for day in days}
+
+    cached = cache.get_many(list(keys.values()))
+    result = {day: cached[key] for day, key in keys.items() if key in cached}
+    missing = [day for day in days if day not in result]
+    if missing:
+        # One query over the missed span, then cache every day of it
+        span = [missing[0] + timedelta(days=offset) for offset in range((missing[-1] - missing[0]).days + 1)]
+        computed = compute_free_slots(employee_id, span, slot_minutes)
+        cache.set_many({keys[day]: slots for day, slots in computed.items()}, AVAILABILITY_TIMEOUT)
+        result.update(computed)
+    return [(day, result[day]) for day in days]
+
+
+def lock_providers(employee_ids):
+    """Serialize bookings per provider until the surrounding transaction ends."""
+    list(EmployeeRegistration.objects.select_for_update().filter(pk__in=employee_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def save_request(serializer, **kwargs):
+    """Save a ServiceRequestSerializer, refusing windows that overlap the provider's other requests."""
+    instance = serializer.instance
+    data = serializer.validated_data
+    if 'service_registry' in data:
+        employee_id = data['service_registry'].employee_id
+    else:
+        employee_id = instance.employee_id or instance.service_registry.employee_id
+    from_time = data.get('from_time') or instance.from_time
+    to_time = data.get('to_time') or instance.to_time
+
+    with transaction.atomic():
+        lock_providers([employee_id])
+        exclude_pk = instance.pk if instance else None
+        if find_conflicts([(employee_id, from_time, to_time)], exclude_pk=exclude_pk)[0]:
+            raise BookingConflict("The provider is already booked in this time window.")
+        try:
+            with transaction.atomic():
+                return serializer.save(**kwargs)
+        except IntegrityError as exc:
+            # Concurrent insert caught by the PostgreSQL exclusion constraint
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise BookingConflict("The provider is already booked in this time window.")
+            raise
+
+
+def install_overlap_constraint(sender, using, **kwargs):
+    """
+    post_migrate hook: backfill ServiceRequest.employee and, on PostgreSQL, add
+    an exclusion constraint so no two requests of a provider can overlap.
+    Other backends rely on the indexed check in save_request().
+    """
+    connection = connections[using]
+    table = ServiceRequest._meta.db_table
+    if table not in connection.introspection.table_names():
+        return
+
+    ServiceRequest.objects.using(using).filter(employee__isnull=True).update(
+        employee_id=Subquery(ServiceRegistry.objects.filter(pk=OuterRef('service_registry_id')).values('employee_id')[:1])
+    )
+
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_constraint WHERE conname = %s", [OVERLAP_CONSTRAINT])
+            if cursor.fetchone():
+                return
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cursor.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+                f"EXCLUDE USING gist (employee_id WITH =, tstzrange(from_time, to_time, '[)') WITH &&) "
+                f"WHERE (employee_id IS NOT NULL)"
+            )
+    except DatabaseError as exc:
+        logger.warning("Could not add %s, overlaps are only checked in save_request(): %s", OVERLAP_CONSTRAINT, exc)
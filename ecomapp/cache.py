@@ -0,0 +1,149 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(namespace):
+    return f"version:{namespace}"
+
+
+def _fresh_version():
+    # A lost version key must not restart at a number whose keys may still be
+    # cached, so new sequences start from the clock instead of 1
+    return time.time_ns()
+
+
+def get_version(namespace):
+    """Current version number of a cached namespace."""
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        version = _fresh_version()
+        cache.add(_version_key(namespace), version, timeout=None)
+        version = cache.get(_version_key(namespace), version)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every key of a namespace by moving it to a new version."""
+    key = _version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key evicted or never set, start a fresh version sequence
+        version = _fresh_version()
+        cache.add(key, version, timeout=None)
+        return cache.get(key, version)
+
+
+def namespace_prefix(namespace):
+    return f"{namespace}:v{get_version(namespace)}"
+
+
+def versioned_key(namespace, *parts):
+    suffix = ":".join(str(part) for part in parts)
+    return f"{namespace_prefix(namespace)}:{suffix}"
+
+
+CATALOG_NAMESPACE = "catalog"
+CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+def get_or_build_catalog(builder):
+    """Shared service catalog, rebuilt only after a Services/Subservices change."""
+    return cache.get_or_set(versioned_key(CATALOG_NAMESPACE, "services"), builder, CATALOG_TIMEOUT)
+
+
+AVAILABILITY_TIMEOUT = 60 * 60
+
+
+def availability_namespace(employee_id):
+    return f"availability:{employee_id}"
+
+
+class TwoTierCache:
+    """
+    Small in-process LRU in front of the shared cache.
+
+    Local entries live for `local_ttl` seconds only, which bounds how long
+    another process can serve a value after delete(); the shared tier is
+    cleared immediately. Values are kept pickled so every get() returns a
+    private copy.
+    """
+
+    def __init__(self, namespace, local_ttl, shared_ttl, max_entries=1024):
+        self.namespace = namespace
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        self.max_entries = max_entries
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_shared = 0
+        self.misses = 0
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(key)
+                self.hits_local += 1
+                return pickle.loads(entry[1])
+
+        data = cache.get(self._key(key))
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        self._remember(key, data)
+        with self._lock:
+            self.hits_shared += 1
+        return pickle.loads(data)
+
+    def set(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        cache.set(self._key(key), data, self.shared_ttl)
+        self._remember(key, data)
+
+    def delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        cache.delete(self._key(key))
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        cache.delete_many([self._key(key) for key in keys])
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, data)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits_local': self.hits_local,
+                'hits_shared': self.hits_shared,
+                'misses': self.misses,
+                'local_entries': len(self._local),
+            }
+
+
+user_cache = TwoTierCache(
+    "auth:user",
+    local_ttl=settings.AUTH_USER_CACHE_LOCAL_TTL,
+    shared_ttl=settings.AUTH_USER_CACHE_TTL,
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+)
@@ -1,11 +1,133 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from .models import OTP
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+from .models import EmailOutbox
 
-def send_otp_via_email(email, otp_code):
-    subject = "Your OTP Verification Code"
-    message = f"Your OTP code is: {otp_code}. It will expire in 5 minutes."
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [email]
+OTP_SUBJECT = "Your OTP Verification Code"
+OTP_MESSAGE = "Your OTP code is: {otp_code}. It will expire in 5 minutes."
 
-    send_mail(subject, message, from_email, recipient_list)
\ No newline at end of file
+FINISHED = ['sent', 'failed']
+
+
+def enqueue_email(subject, message, recipient, from_email=None, expires_at=None):
+    """Store the message for the outbox worker instead of talking SMTP in the request."""
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipient=recipient,
+        expires_at=expires_at,
+    )
+
+
+def enqueue_otp_email(email, otp_code):
+    # A code that arrives after its TTL is useless, so it is never retried past it
+    expires_at = timezone.now() + timedelta(seconds=settings.OTP_TTL_SECONDS)
+    return enqueue_email(OTP_SUBJECT, OTP_MESSAGE.format(otp_code=otp_code), email, expires_at=expires_at)
+
+
+def claim_outbox(batch_size, lease_seconds, stats):
+    """
+    Lease a batch of due messages to this worker in one short transaction.
+
+    Claimed rows move to 'sending' until the lease ends; a worker that dies
+    mid-batch leaves them due again afterwards. Expired messages are failed
+    here instead of being sent.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        expired = [message for message in batch if message.expires_at and message.expires_at <= now]
+        for message in expired:
+            message.status = 'failed'
+            message.last_error = "Expired before it could be sent."
+            message.body = ''
+        stats['failed'] += len(expired)
+        batch = [message for message in batch if message not in expired]
+        for message in batch:
+            message.status = 'sending'
+            message.next_attempt_at = now + timedelta(seconds=lease_seconds)
+        EmailOutbox.objects.bulk_update(batch + expired, ['status', 'next_attempt_at', 'last_error', 'body'])
+    return batch
+
+
+def drain_outbox(batch_size=100, max_attempts=5, backoff_seconds=30, connection=None):
+    """
+    Send one batch of due messages over a single mail connection.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED so several
+    workers can drain the same table, and sent with no transaction or row
+    lock held. Failed sends are retried with exponential backoff until
+    `max_attempts` or the message's expiry, then marked failed. The body of
+    a finished message is cleared. Returns counts and the enqueue-to-send
+    latency of every sent message.
+    """
+    stats = {'sent': 0, 'retried': 0, 'failed': 0, 'latencies': []}
+    # Every send is bounded by EMAIL_TIMEOUT, so the lease outlasts the whole batch
+    lease_seconds = (settings.EMAIL_TIMEOUT or 60) * (batch_size + 1)
+    batch = claim_outbox(batch_size, lease_seconds, stats)
+    if not batch:
+        return stats
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # No connection at all: every message of the batch is retried later
+        for message in batch:
+            _record_failure(message, exc, max_attempts, backoff_seconds, stats)
+    else:
+        try:
+            for message in batch:
+                try:
+                    EmailMessage(
+                        message.subject, message.body, message.from_email, [message.recipient],
+                        connection=connection,
+                    ).send()
+                except Exception as exc:
+                    _record_failure(message, exc, max_attempts, backoff_seconds, stats)
+                else:
+                    message.status = 'sent'
+                    message.sent_at = timezone.now()
+                    message.attempts += 1
+                    message.body = ''
+                    stats['sent'] += 1
+                    stats['latencies'].append((message.sent_at - message.created_at).total_seconds())
+        finally:
+            connection.close()
+
+    EmailOutbox.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body'])
+    return stats
+
+
+def _record_failure(message, exc, max_attempts, backoff_seconds, stats):
+    message.attempts += 1
+    message.last_error = str(exc)
+    message.status = 'pending'
+    message.next_attempt_at = timezone.now() + timedelta(seconds=backoff_seconds * 2 ** (message.attempts - 1))
+    if message.attempts >= max_attempts or (message.expires_at and message.next_attempt_at >= message.expires_at):
+        message.status = 'failed'
+        message.body = ''
+        stats['failed'] += 1
+    else:
+        stats['retried'] += 1
+
+
+def purge_outbox(older_than, batch_size=5000):
+    """Delete sent and failed messages created before `older_than`, one bounded batch at a time."""
+    # Old rows sit at the low end of the primary key, so each batch is found
+    # by a short primary key scan
+    finished = EmailOutbox.objects.filter(status__in=FINISHED, created_at__lt=older_than).order_by('id')
+    purged = 0
+    while True:
+        ids = list(finished.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        deleted, _ = EmailOutbox.objects.filter(id__in=ids).delete()
+        purged += deleted
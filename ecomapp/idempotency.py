@@ -0,0 +1,71 @@
+import functools
+import hashlib
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+RESULT_TTL = 24 * 60 * 60
+LOCK_TTL = 60
+
+
+def idempotent(view_method):
+    """
+    Honour an `Idempotency-Key` header on an APIView handler.
+
+    The first response for a (user, path, key) is stored in the cache and
+    replayed for retries without running the handler again. A retry that
+    arrives while the first attempt is still running gets 409, and reusing
+    a key with a different body gets 422. Server errors are not stored, so
+    they can be retried.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        idempotency_key = request.META.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return view_method(self, request, *args, **kwargs)
+        if len(idempotency_key) > 255:
+            return Response({"error": "Idempotency-Key is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        owner = request.user.pk if request.user.is_authenticated else 'anonymous'
+        digest = hashlib.sha256(f"{owner}:{request.path}:{idempotency_key}".encode()).hexdigest()
+        result_key = f"idempotency:{digest}"
+        lock_key = f"{result_key}:lock"
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+
+        stored = cache.get(result_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        if not cache.add(lock_key, 1, LOCK_TTL):
+            return Response({"error": "A request with this Idempotency-Key is still in progress."}, status=status.HTTP_409_CONFLICT)
+        try:
+            # The first attempt may have finished between the lookup and the lock
+            stored = cache.get(result_key)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                cache.set(result_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, RESULT_TTL)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {"error": "Idempotency-Key was already used with a different request body."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
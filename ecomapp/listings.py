@@ -0,0 +1,86 @@
+from django.db.models import FloatField, Value
+from django.db.models.functions import Coalesce
+
+from .models import ServiceRegistry
+from .pagination import KeysetPagination
+
+
+# Keyset ordering behind each ?sort= value, unique thanks to the trailing primary key
+LISTING_SORTS = {
+    'newest': ('-id',),
+    'price': ('min_price', 'id'),
+    '-price': ('-min_price', '-id'),
+    'rating': ('-rating', '-id'),
+}
+
+# Averages run from 1 to 5, so unrated listings sort after every rated one;
+# keyset cursors need a key that is never NULL
+UNRATED = -1.0
+RATING_SORT_KEY = Coalesce('rating_summary__average_rating', Value(UNRATED), output_field=FloatField())
+
+
+def filter_listings(queryset, service=None, budget_min=None, budget_max=None, min_rating=None, sort='newest'):
+    """
+    Narrow ServiceRegistry rows to the listing search filters.
+
+    A listing fits a budget when its [min_price, max_price] overlaps
+    [budget_min, budget_max]. Unrated listings have no average, so they
+    never match a rating bound; the sort order never drops rows.
+    """
+    if service:
+        queryset = queryset.filter(service__in=service)
+    if budget_max is not None:
+        queryset = queryset.filter(min_price__lte=budget_max)
+    if budget_min is not None:
+        queryset = queryset.filter(max_price__gte=budget_min)
+    if min_rating is not None:
+        queryset = queryset.filter(rating_summary__average_rating__gte=min_rating)
+    if sort == 'rating':
+        queryset = queryset.annotate(rating=RATING_SORT_KEY)
+    return queryset
+
+
+def listing_keys(filters):
+    """
+    Id and sort key of every matching listing, for the keyset paginator.
+
+    Only indexed columns are read here, so the page is found with an index
+    only scan and the full rows are fetched afterwards by primary key.
+    """
+    ordering = LISTING_SORTS[filters.get('sort', 'newest')]
+    fields = {'id'} | {name.lstrip('-') for name in ordering}
+    return filter_listings(ServiceRegistry.objects.all(), **filters).values(*sorted(fields))
+
+
+class RatingPagination(KeysetPagination):
+    """
+    Keyset pages in ('-rating', '-id') order, unrated listings last.
+
+    Ordering by the coalesced rating would sort every listing on each page,
+    so rated listings are read along ratingsummary_rating_idx first and the
+    unrated ones by primary key after them.
+    """
+    ordering = LISTING_SORTS['rating']
+    rated = KeysetPagination(ordering=('-rating_summary__average_rating', '-rating_summary__listing'))
+    unrated = KeysetPagination(ordering=('-id',))
+
+    def __init__(self, include_unrated=True):
+        self.include_unrated = include_unrated
+
+    def get_querysets(self, queryset, position):
+        querysets = []
+        if position is None or position[0] != UNRATED:
+            querysets += self.rated.get_querysets(queryset.filter(rating_summary__average_rating__isnull=False), position)
+            position = None
+        if self.include_unrated:
+            unrated = queryset.filter(rating_summary__average_rating__isnull=True)
+            querysets += self.unrated.get_querysets(unrated, position and position[1:])
+        return querysets
+
+
+def listing_pagination(filters):
+    sort = filters.get('sort', 'newest')
+    if sort == 'rating':
+        # A rating bound already excludes every unrated listing
+        return RatingPagination(include_unrated=filters.get('min_rating') is None)
+    return KeysetPagination(ordering=LISTING_SORTS[sort])
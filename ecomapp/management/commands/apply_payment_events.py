@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecomapp.webhooks import apply_payment_events
+
+
+class Command(BaseCommand):
+    help = "Apply queued payment webhook events to Payment rows in batched, ordered updates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Events applied per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting once the queue is empty.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep between polls of an empty queue.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            events, payments, deferred, dead = apply_payment_events(options['batch_size'])
+            if events:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"applied {events - deferred - dead} events ({payments} payments updated, "
+                    f"{deferred} deferred until their order exists, {dead} dead-lettered) in {elapsed * 1000:.0f}ms"
+                )
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,88 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ecomapp.benchmarks import compare, load_baseline, summarize
+from ecomapp.models import Register
+from ecomapp.seeding import DEFAULT_VOLUMES, seed_data
+
+
+ENDPOINTS = [
+    ('services', '/services/'),
+    ('service-registry', '/service-registry/'),
+    ('service-requests', '/service-requests/'),
+    ('bookings', '/bookings/'),
+    ('my-bookings', '/bookings/me/'),
+    ('reviews', '/reviews/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database, time the read endpoints through the test client and print "
+        "p50/p95/p99 latency and query counts as JSON. Run with --settings=ecommerce.bench_settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="Timed requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed requests per endpoint first.")
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help="Only run these endpoints (repeatable).")
+        parser.add_argument('--output', help="Also write the JSON results to this file.")
+        parser.add_argument('--baseline', help="Fail if results regress against this earlier --output file.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p95 growth over the baseline, as a fraction.")
+        for name, default in DEFAULT_VOLUMES.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f"{name.capitalize()} rows to seed.")
+
+    def handle(self, *args, **options):
+        endpoints = [endpoint for endpoint in ENDPOINTS if not options['endpoints'] or endpoint[0] in options['endpoints']]
+        if not endpoints:
+            raise CommandError(f"Unknown endpoint, choose from: {', '.join(name for name, _ in ENDPOINTS)}")
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            seed_data(volumes)
+            results = {'volumes': volumes, 'iterations': options['iterations'], 'endpoints': {}}
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(Register.objects.order_by("pk").first())}')
+            for name, url in endpoints:
+                results['endpoints'][name] = self.run_endpoint(client, url, options['iterations'], options['warmup'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(results, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+
+        if options['baseline']:
+            regressions = compare(results, load_baseline(options['baseline']), options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline."))
+
+    def run_endpoint(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            self.get(client, url)
+        latencies, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                self.get(client, url)
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+        return summarize(latencies, queries)
+
+    def get(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} returned {response.status_code}: {response.content[:200]!r}")
+        return response
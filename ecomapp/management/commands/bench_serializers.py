@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from ecomapp.models import BookingList, Review, ServiceRegistry, ServiceRequest
+from ecomapp.serializers import (
+    BookingListSerializer,
+    ReviewSerializer,
+    ServiceRegistrySerializer,
+    ServiceRequestSerializer,
+    ValuesSerializer,
+)
+
+
+CASES = [
+    ('service-registry', ServiceRegistrySerializer, lambda: ServiceRegistry.objects.select_related('employee', 'service', 'rating_summary')),
+    ('service-requests', ServiceRequestSerializer, lambda: ServiceRequest.objects.all()),
+    ('bookings', BookingListSerializer, lambda: BookingList.objects.select_related('register', 'service_request')),
+    ('reviews', ReviewSerializer, lambda: Review.objects.select_related('service__employee', 'service__service', 'service__rating_summary')),
+]
+
+
+class Command(BaseCommand):
+    help = "Check ValuesSerializer output against the ModelSerializers and time both per row."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Rows read per endpoint.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per serializer, best one is kept.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        renderer = JSONRenderer()
+        mismatches = []
+        empty = []
+
+        for name, serializer_class, queryset in CASES:
+            fast = ValuesSerializer(serializer_class)
+
+            def model_path():
+                return serializer_class(list(queryset().order_by('pk')[:rows]), many=True).data
+
+            def values_path():
+                return fast.to_representation(list(fast.values(queryset()).order_by('pk')[:rows]))
+
+            expected, actual = model_path(), values_path()
+            if renderer.render(expected) != renderer.render(actual):
+                mismatches.append(name)
+
+            count = len(expected)
+            if not count:
+                empty.append(name)
+                continue
+            model_time = min(self._time(model_path) for _ in range(repeat))
+            values_time = min(self._time(values_path) for _ in range(repeat))
+            self.stdout.write(
+                f"{name}: {count} rows, ModelSerializer {model_time / count * 1e6:.1f} us/row, "
+                f"ValuesSerializer {values_time / count * 1e6:.1f} us/row "
+                f"({model_time / values_time:.1f}x)"
+            )
+
+        if mismatches:
+            raise CommandError(f"ValuesSerializer output differs for: {', '.join(mismatches)}")
+        if empty:
+            raise CommandError(f"No rows to compare for: {', '.join(empty)}. Seed the database first (manage.py seed).")
+        self.stdout.write(self.style.SUCCESS("ValuesSerializer output matches the ModelSerializers."))
+
+    def _time(self, func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
@@ -0,0 +1,62 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from ecomapp.models import Register
+from ecomapp.serializers import RedisTokenRefreshSerializer
+
+
+BACKENDS = [
+    ('database', TokenRefreshSerializer),
+    ('redis', RedisTokenRefreshSerializer),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure refresh-token rotation throughput with the token_blacklist tables and with the Redis "
+        "blacklist. Everything written to the database is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refreshes', type=int, default=500, help="Rotations timed per backend.")
+        parser.add_argument('--backlog', type=int, default=0, help="Blacklisted rows to insert first, to simulate grown tables.")
+
+    def handle(self, *args, **options):
+        for name, serializer_class in BACKENDS:
+            with transaction.atomic():
+                user = Register.objects.create_user(f'bench-refresh@{name}.invalid', None, name='bench', phone_number='0')
+                self._fill_backlog(user, options['backlog'])
+                refresh = str(serializer_class.token_class.for_user(user))
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    for _ in range(options['refreshes']):
+                        serializer = serializer_class(data={'refresh': refresh})
+                        serializer.is_valid(raise_exception=True)
+                        refresh = serializer.validated_data['refresh']
+                    elapsed = time.perf_counter() - start
+
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{name}: {options['refreshes'] / elapsed:.0f} refreshes/s, "
+                f"{elapsed / options['refreshes'] * 1000:.2f} ms each, "
+                f"{len(queries) / options['refreshes']:.1f} queries each"
+            )
+
+    def _fill_backlog(self, user, count):
+        expires_at = timezone.now() + timedelta(days=1)
+        for offset in range(0, count, 5000):
+            size = min(5000, count - offset)
+            tokens = OutstandingToken.objects.bulk_create([
+                OutstandingToken(user=user, jti=f'bench-{offset + index}', token='', expires_at=expires_at)
+                for index in range(size)
+            ])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens])
@@ -0,0 +1,199 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ecomapp import payments
+from ecomapp.benchmarks import LocalGateway, latest_otp
+from ecomapp.cache import user_cache
+from ecomapp.metrics import get_query_budget
+from ecomapp.models import Payment, Register, ServiceRegistry, ServiceRequest
+from ecomapp.seeding import SEED_PASSWORD, seed_data
+from ecomapp.tokens import RedisRefreshToken
+
+
+BASE_VOLUMES = {
+    'services': 5,
+    'subservices': 15,
+    'providers': 10,
+    'listings': 20,
+    'users': 10,
+    'requests': 40,
+    'reviews': 40,
+    'payments': 20,
+}
+
+
+def slot(ids, hours):
+    from_time = timezone.now() + timedelta(days=3650, hours=hours)
+    return {'service_registry': ids['listing'], 'from_time': from_time.isoformat(), 'to_time': (from_time + timedelta(hours=1)).isoformat()}
+
+
+def booking(ids, hours):
+    return {**slot(ids, hours), 'title': 'Budget check', 'description': 'Budget check'}
+
+
+PROFILE = {
+    'full_name': 'Budget Check', 'address': 'Street 1', 'email': 'budget@check.invalid', 'phone_number': '9000000000',
+    'date_of_birth': '1990-01-01', 'gender': 'other', 'house_name': 'House', 'landmark': 'Park', 'pin_code': '560001',
+    'district': 'District', 'state': 'State',
+}
+
+
+# Run in order against one seeded database; paths, bodies and headers are
+# built from the seeded ids just before each request.
+CASES = [
+    {'name': 'register', 'method': 'POST', 'path': '/register/', 'status': 201,
+     'body': lambda ids: {'email': 'budget@check.invalid', 'name': 'Budget', 'phone_number': '9000000000', 'password': 'budget-check-1'}},
+    {'name': 'token_obtain_pair', 'method': 'POST', 'path': '/token/', 'status': 200,
+     'body': lambda ids: {'email': ids['email'], 'password': SEED_PASSWORD}},
+    {'name': 'token_refresh', 'method': 'POST', 'path': '/token/refresh/', 'status': 200, 'body': lambda ids: {'refresh': ids['refresh']}},
+    {'name': 'login', 'method': 'POST', 'path': '/login/', 'status': 200, 'body': lambda ids: {'email': ids['email'], 'password': SEED_PASSWORD}},
+    {'name': 'verify-otp', 'method': 'POST', 'path': '/verify-otp/', 'status': 200,
+     'body': lambda ids: {'email': ids['email'], 'otp_code': latest_otp(ids['email'])}},
+    {'name': 'profile-create', 'method': 'POST', 'path': '/profile/', 'status': 201, 'body': lambda ids: PROFILE},
+    {'name': 'profile-create', 'method': 'GET', 'path': '/profile/', 'status': 200},
+    {'name': 'profile-create', 'method': 'PUT', 'path': '/profile/', 'status': 200, 'body': lambda ids: PROFILE},
+    {'name': 'profile-create', 'method': 'PATCH', 'path': '/profile/', 'status': 200, 'body': lambda ids: {'landmark': 'Lake'}},
+    {'name': 'profile-create', 'method': 'DELETE', 'path': '/profile/', 'status': 204},
+    {'name': 'services', 'method': 'GET', 'path': '/services/', 'status': 200},
+    {'name': 'service-registry', 'method': 'GET', 'path': '/service-registry/', 'status': 200},
+    {'name': 'service-registry-search', 'method': 'GET', 'status': 200,
+     'path': '/service-registry/?service={service}&budget_min=500&budget_max=3000&min_rating=3&sort=rating'},
+    {'name': 'service-registry-rating', 'method': 'GET', 'path': '/service-registry/?sort=rating&page_size=100', 'status': 200},
+    {'name': 'search', 'method': 'GET', 'path': '/search/?q=repair+installation', 'status': 200},
+    {'name': 'listing-reviews', 'method': 'GET', 'path': '/service-registry/{listing}/reviews/', 'status': 200},
+    {'name': 'listing-availability', 'method': 'GET', 'path': '/service-registry/{listing}/availability/?start={today}&end={week}', 'status': 200},
+    {'name': 'provider-availability', 'method': 'GET', 'path': '/providers/{employee}/availability/?start={today}&end={week}', 'status': 200},
+    {'name': 'service-request-list', 'method': 'GET', 'path': '/service-requests/', 'status': 200},
+    {'name': 'service-request-list', 'method': 'POST', 'path': '/service-requests/', 'status': 201, 'body': lambda ids: booking(ids, 0)},
+    {'name': 'service-request-detail', 'method': 'GET', 'path': '/service-requests/{request}/', 'status': 200},
+    {'name': 'service-request-detail', 'method': 'PUT', 'path': '/service-requests/{request}/', 'status': 200, 'body': lambda ids: booking(ids, 4)},
+    {'name': 'service-request-detail', 'method': 'PATCH', 'path': '/service-requests/{request}/', 'status': 200,
+     'body': lambda ids: {'title': 'Budget check, renamed'}},
+    {'name': 'service-request-detail', 'method': 'DELETE', 'path': '/service-requests/{request}/', 'status': 204},
+    {'name': 'service-request-bulk', 'method': 'POST', 'path': '/service-requests/bulk/', 'status': 201,
+     'body': lambda ids: [booking(ids, 2 * index + 10) for index in range(5)]},
+    {'name': 'service-request-check-slots', 'method': 'POST', 'path': '/service-requests/check-slots/', 'status': 200,
+     'body': lambda ids: {'slots': [slot(ids, 2 * index + 100) for index in range(5)]}},
+    {'name': 'booking-list', 'method': 'GET', 'path': '/bookings/', 'status': 200},
+    {'name': 'my-booking-list', 'method': 'GET', 'path': '/bookings/me/', 'status': 200},
+    {'name': 'reviews', 'method': 'GET', 'path': '/reviews/', 'status': 200},
+    {'name': 'reviews', 'method': 'POST', 'path': '/reviews/', 'status': 201,
+     'body': lambda ids: {'service': ids['listing'], 'rating': 4, 'comment': 'Budget check'}},
+    {'name': 'create-order', 'method': 'POST', 'path': '/create-order/', 'status': 201,
+     'body': lambda ids: {'amount': 500, 'employee_id': ids['employee']}},
+    {'name': 'verify-payment', 'method': 'POST', 'path': '/verify-payment/', 'status': 200,
+     'body': lambda ids: {'order_id': ids['order'], 'payment_id': 'pay_budget', 'signature': 'checked-by-local-gateway'}},
+    {'name': 'payment-webhook', 'method': 'POST', 'path': '/payments/webhook/', 'status': 200,
+     'body': lambda ids: {'event': 'payment.captured', 'created_at': 0, 'payload': {'payment': {'entity': {'id': 'pay_budget', 'order_id': ids['order']}}}},
+     'headers': {'HTTP_X_RAZORPAY_SIGNATURE': 'checked-by-local-gateway', 'HTTP_X_RAZORPAY_EVENT_ID': 'evt_budget'}},
+    {'name': 'logout', 'method': 'POST', 'path': '/logout/', 'status': 200, 'body': lambda ids: {'refresh': ids['logout_refresh']}},
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every API endpoint against 1x and 10x seeded data and fail if a query count grows with "
+        "the data or exceeds the view's query_budget. Run with --settings=ecommerce.bench_settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10, help="Multiplier of the larger data set.")
+        parser.add_argument('--json', action='store_true', help="Print the measured counts as JSON.")
+        parser.add_argument(
+            '--no-create-db', action='store_true',
+            help="Measure in the current database, which must already be a disposable test database; it is flushed.",
+        )
+
+    def handle(self, *args, **options):
+        old_name = None
+        if not options['no_create_db']:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        previous_gateway = payments._gateway
+        payments._gateway = LocalGateway()
+        try:
+            with override_settings(RAZORPAY_WEBHOOK_SECRET='budget-check'):
+                if old_name is None:
+                    call_command('flush', interactive=False, verbosity=0)
+                small = self.measure(1)
+                call_command('flush', interactive=False, verbosity=0)
+                large = self.measure(options['scale'])
+        finally:
+            payments._gateway = previous_gateway
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        failures = []
+        report = {}
+        for key, (count, status, budget) in small.items():
+            large_count = large[key][0]
+            report[key] = {'budget': budget, 'queries_1x': count, f"queries_{options['scale']}x": large_count}
+            if status != large[key][1]:
+                failures.append(f"{key}: status {status} at 1x but {large[key][1]} at {options['scale']}x")
+            if budget is None:
+                failures.append(f"{key}: the view declares no query_budget")
+            elif max(count, large_count) > budget:
+                failures.append(f"{key}: {max(count, large_count)} queries, budget is {budget}")
+            if large_count > count:
+                failures.append(f"{key}: {count} queries at 1x but {large_count} at {options['scale']}x")
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for key, row in report.items():
+                counts = ' -> '.join(str(value) for name, value in row.items() if name.startswith('queries'))
+                self.stdout.write(f"{key:<40} {counts:>10}   budget {row['budget']}")
+
+        if failures:
+            raise CommandError("Query budget violations:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("Every endpoint is within its query budget."))
+
+    def measure(self, scale):
+        """{'METHOD name': (queries, status, budget)} against an empty database seeded at `scale`."""
+        cache.clear()
+        seed_data({name: count * scale for name, count in BASE_VOLUMES.items()})
+        user = Register.objects.order_by('pk').first()
+        listing = ServiceRegistry.objects.order_by('pk').first()
+        today = timezone.localdate()
+        ids = {
+            'listing': listing.pk,
+            'employee': listing.employee_id,
+            'service': listing.service_id,
+            'request': ServiceRequest.objects.filter(register=user).order_by('pk').values_list('pk', flat=True).first(),
+            'order': Payment.objects.order_by('pk').values_list('order_id', flat=True).first(),
+            'email': user.email,
+            'refresh': str(RedisRefreshToken.for_user(user)),
+            'logout_refresh': str(RedisRefreshToken.for_user(user)),
+            'today': today.isoformat(),
+            'week': (today + timedelta(days=6)).isoformat(),
+        }
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+        results = {}
+        for case in CASES:
+            url = case['path'].format(**ids)
+            body = json.dumps(case['body'](ids)) if 'body' in case else ''
+            # Reads are counted on the cold path, catalog and availability cache
+            # misses included; writes keep the cache, it holds OTPs and revoked tokens.
+            if case['method'] == 'GET':
+                cache.clear()
+            user_cache.delete(user.pk)
+            with CaptureQueriesContext(connection) as captured:
+                response = client.generic(case['method'], url, body, content_type='application/json', **case.get('headers', {}))
+            if response.status_code != case['status']:
+                raise CommandError(f"{case['method']} {url} returned {response.status_code}, expected {case['status']}: {response.content[:300]!r}")
+            view_class = resolve(url.partition('?')[0]).func.view_class
+            key = f"{case['method']} {case['name']}"
+            results[key] = (len(captured), response.status_code, get_query_budget(view_class, case['method']))
+        return results
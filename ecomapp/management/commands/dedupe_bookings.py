@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from ecomapp.models import BookingList
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete duplicate BookingList rows, keeping the oldest booking of each service request. "
+        "Works in small transactions so the table is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Service requests cleaned per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many rows would be deleted.")
+
+    def handle(self, *args, **options):
+        batch_size, dry_run = options['batch_size'], options['dry_run']
+        duplicates = (
+            BookingList.objects.exclude(service_request=None)
+            .values('service_request')
+            .annotate(keep=Min('id'), rows=Count('id'))
+            .filter(rows__gt=1)
+            .order_by('service_request')
+        )
+
+        last_request = 0
+        deleted = 0
+        while True:
+            batch = list(duplicates.filter(service_request__gt=last_request)[:batch_size])
+            if not batch:
+                break
+            last_request = batch[-1]['service_request']
+            if dry_run:
+                deleted += sum(row['rows'] - 1 for row in batch)
+                continue
+            with transaction.atomic():
+                removed, _ = (
+                    BookingList.objects.filter(service_request_id__in=[row['service_request'] for row in batch])
+                    .exclude(pk__in=[row['keep'] for row in batch])
+                    .delete()
+                )
+            deleted += removed
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} duplicate booking rows."))
@@ -0,0 +1,105 @@
+import json
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count
+
+from ecomapp.listings import listing_keys, listing_pagination
+from ecomapp.models import RatingSummary, ServiceRegistry
+from ecomapp.seeding import seed
+
+
+PAGE_SIZE = 20
+
+SCENARIOS = [
+    ('newest', lambda ids: {}),
+    ('service', lambda ids: {'service': [ids['service']]}),
+    ('service + budget', lambda ids: {'service': [ids['service']], 'budget_min': 1500, 'budget_max': 2500}),
+    ('service + budget, price sort', lambda ids: {'service': [ids['service']], 'budget_min': 1500, 'budget_max': 2500, 'sort': 'price'}),
+    ('budget, price sort', lambda ids: {'budget_min': 1500, 'budget_max': 2500, 'sort': 'price'}),
+    ('service, -price sort', lambda ids: {'service': [ids['service']], 'sort': '-price'}),
+    ('rating sort', lambda ids: {'sort': 'rating'}),
+    ('min rating 4, rating sort', lambda ids: {'min_rating': 4, 'sort': 'rating'}),
+    ('service + min rating 4', lambda ids: {'service': [ids['service']], 'min_rating': 4}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the query plan and first-page latency of the /service-registry/ search for each filter "
+        "and sort combination. --seed-listings appends synthetic listings first, e.g. 1000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-listings', type=int, default=0, help="Listings to append before explaining.")
+        parser.add_argument('--workers', type=int, default=1, help="Seeding worker processes (PostgreSQL only).")
+        parser.add_argument('--runs', type=int, default=5, help="Timed executions per scenario.")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database alias to explain against.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        if options['seed_listings']:
+            listings = options['seed_listings']
+            seed(
+                {'listings': listings, 'reviews': listings, 'providers': max(200, listings // 20),
+                 'users': 1000, 'requests': 0, 'payments': 0},
+                chunk_size=50000,
+                batch_size=2000,
+                workers=options['workers'],
+                using=using,
+            )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        service = (
+            ServiceRegistry.objects.using(using).values('service')
+            .annotate(listings=Count('id')).order_by('-listings').values_list('service', flat=True).first()
+        )
+        ids = {'service': service}
+        results = []
+        for name, filters in SCENARIOS:
+            filters = filters(ids)
+            keys = listing_keys(filters).using(using)
+            paginator = listing_pagination(filters)
+            timings = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                rows = paginator.get_rows(keys, None, PAGE_SIZE + 1)
+                timings.append((time.perf_counter() - start) * 1000)
+            # The rating sort reads rated listings first, then unrated ones
+            plans = []
+            for queryset in paginator.get_querysets(keys, None):
+                queryset = queryset[:PAGE_SIZE + 1]
+                plans.append(queryset.explain(analyze=True, buffers=True) if connection.vendor == 'postgresql' else queryset.explain())
+            plan = "\n".join(plans)
+            results.append({
+                'scenario': name,
+                'filters': filters,
+                'rows': len(rows),
+                'median_ms': round(statistics.median(timings), 3),
+                'index_only': 'Index Only Scan' in plan or 'COVERING INDEX' in plan,
+                'table_scan': 'Seq Scan' in plan or re.search(r'\bSCAN \w+$', plan, re.MULTILINE) is not None,
+                'plan': plan,
+            })
+
+        totals = {
+            'listings': ServiceRegistry.objects.using(using).count(),
+            'rated': RatingSummary.objects.using(using).filter(average_rating__isnull=False).count(),
+            'vendor': connection.vendor,
+        }
+        if options['json']:
+            self.stdout.write(json.dumps({'data': totals, 'scenarios': results}, indent=2))
+            return
+
+        self.stdout.write(f"{totals['listings']:,} listings, {totals['rated']:,} rated, on {totals['vendor']}\n")
+        for row in results:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{row['scenario']}: {row['median_ms']:.3f} ms, {row['rows']} rows, "
+                f"index only: {'yes' if row['index_only'] else 'no'}, table scan: {'yes' if row['table_scan'] else 'no'}"
+            ))
+            self.stdout.write(row['plan'] + "\n")
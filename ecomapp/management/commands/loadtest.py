@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from ecomapp import payments
+from ecomapp.benchmarks import LocalGateway, latest_otp, summarize
+from ecomapp.models import Register, ServiceRegistry
+from ecomapp.seeding import DEFAULT_VOLUMES, SEED_PASSWORD, seed_data
+
+
+DEFAULT_MIX = 'browse=50,book=20,review=15,login=10,pay=5'
+
+
+async def asgi_request(application, method, path, body=None, token=None):
+    """One HTTP request straight into the ASGI callable; returns (status, body bytes)."""
+    path, _, query = path.partition('?')
+    payload = json.dumps(body).encode() if body is not None else b''
+    headers = [(b'host', b'testserver'), (b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    response = {'status': None, 'body': []}
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # No disconnect: the handler cancels this wait once the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await application(scope, receive, send)
+    return response['status'], b''.join(response['body'])
+
+
+class VirtualUser:
+    def __init__(self, index, email, application, listing_ids, stats, rng):
+        self.index = index
+        self.email = email
+        self.application = application
+        self.listing_ids = listing_ids
+        self.stats = stats
+        self.rng = rng
+        self.token = None
+        self.bookings = 0
+
+    async def request(self, name, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            status, content = await asgi_request(self.application, method, path, body, self.token)
+        except Exception:
+            status, content = 599, b''
+        self.stats[name]['latencies'].append(time.perf_counter() - start)
+        self.stats[name]['statuses'][status] += 1
+        return status, content
+
+    async def authenticate(self):
+        status, content = await self.request('token', 'POST', '/token/', {'email': self.email, 'password': SEED_PASSWORD})
+        if status == 200:
+            self.token = json.loads(content)['access']
+
+    async def login(self):
+        status, _ = await self.request('login', 'POST', '/login/', {'email': self.email, 'password': SEED_PASSWORD})
+        if status != 200:
+            return
+        otp_code = await sync_to_async(latest_otp)(self.email)
+        await self.request('verify-otp', 'POST', '/verify-otp/', {'email': self.email, 'otp_code': otp_code or '000000'})
+
+    async def browse(self):
+        listing_id = self.rng.choice(self.listing_ids)
+        await self.request('services', 'GET', '/services/')
+        await self.request('service-registry', 'GET', '/service-registry/')
+        await self.request('listing-reviews', 'GET', f'/service-registry/{listing_id}/reviews/')
+
+    async def book(self):
+        # Far-future slots unique per user and booking, so bookings never overlap
+        self.bookings += 1
+        from_time = timezone.now() + timedelta(days=3650, hours=2 * (self.index * 100000 + self.bookings))
+        await self.request('service-requests', 'POST', '/service-requests/', {
+            'service_registry': self.rng.choice(self.listing_ids),
+            'title': 'Load test booking',
+            'description': 'Created by manage.py loadtest',
+            'from_time': from_time.isoformat(),
+            'to_time': (from_time + timedelta(hours=1)).isoformat(),
+        })
+
+    async def review(self):
+        await self.request('reviews', 'POST', '/reviews/', {
+            'service': self.rng.choice(self.listing_ids),
+            'rating': self.rng.randint(1, 5),
+            'comment': 'Load test review',
+        })
+
+    async def pay(self):
+        await self.request('create-order', 'POST', '/create-order/', {'amount': self.rng.randint(100, 2000), 'employee_id': 1})
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the ASGI application in-process under N concurrent virtual users and report requests/s, "
+        "p50/p99 latency and error rate per endpoint. Run with --settings=ecommerce.bench_settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help="Concurrent virtual users.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds of traffic.")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Scenario weights, default {DEFAULT_MIX}.")
+        parser.add_argument('--listings', type=int, default=200, help="Listings to seed.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and traffic.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        volumes = {
+            **DEFAULT_VOLUMES,
+            'users': max(options['users'], DEFAULT_VOLUMES['users']),
+            'listings': options['listings'],
+            'providers': options['listings'],
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.configure_database(os.path.join(directory, 'loadtest.sqlite3'))
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            previous_gateway = payments._gateway
+            payments._gateway = LocalGateway()
+            try:
+                cache.clear()
+                seed_data(volumes, random_seed=options['seed'])
+                emails = list(Register.objects.order_by('pk').values_list('email', flat=True)[:options['users']])
+                listing_ids = list(ServiceRegistry.objects.values_list('pk', flat=True))
+                connection.close()
+                report = asyncio.run(self.run(emails, listing_ids, mix, options['duration'], options['seed']))
+            finally:
+                payments._gateway = previous_gateway
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def parse_mix(self, value):
+        mix = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            if name not in ('browse', 'book', 'review', 'login', 'pay') or not weight.isdigit():
+                raise CommandError(f"Invalid scenario weight {part!r}, expected e.g. {DEFAULT_MIX}")
+            mix[name] = int(weight)
+        return mix
+
+    def configure_database(self, path):
+        if connection.vendor != 'sqlite':
+            return
+        # A file database in WAL mode lets request threads write concurrently;
+        # the shared in-memory test database fails fast on lock contention.
+        connection.settings_dict['TEST']['NAME'] = path
+        connection.settings_dict['OPTIONS'].update({
+            'timeout': 30,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        })
+
+    async def run(self, emails, listing_ids, mix, duration, seed):
+        from ecommerce.asgi import application
+
+        stats = defaultdict(lambda: {'latencies': [], 'statuses': Counter()})
+        scenarios, weights = list(mix), list(mix.values())
+        users = [
+            VirtualUser(index, email, application, listing_ids, stats, random.Random(seed + index))
+            for index, email in enumerate(emails)
+        ]
+
+        async def virtual_user(user, deadline):
+            await user.authenticate()
+            while time.perf_counter() < deadline:
+                await getattr(user, user.rng.choices(scenarios, weights)[0])()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(virtual_user(user, start + duration) for user in users))
+        elapsed = time.perf_counter() - start
+
+        endpoints = {}
+        for name, data in sorted(stats.items()):
+            count = len(data['latencies'])
+            errors = sum(total for status, total in data['statuses'].items() if status >= 400)
+            summary = summarize(data['latencies'])
+            endpoints[name] = {
+                'requests': count,
+                'requests_per_second': round(count / elapsed, 1),
+                'p50_ms': summary['p50_ms'],
+                'p99_ms': summary['p99_ms'],
+                'error_rate': round(errors / count, 4),
+                'statuses': {str(status): total for status, total in sorted(data['statuses'].items())},
+            }
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'users': len(users),
+            'duration_s': round(elapsed, 2),
+            'requests': total,
+            'requests_per_second': round(total / elapsed, 1),
+            'endpoints': endpoints,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['users']} users, {report['duration_s']}s, {report['requests']} requests, "
+            f"{report['requests_per_second']} req/s"
+        )
+        self.stdout.write(f"{'endpoint':<20}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>9}  statuses")
+        for name, row in report['endpoints'].items():
+            statuses = ' '.join(f'{status}:{total}' for status, total in row['statuses'].items())
+            self.stdout.write(
+                f"{name:<20}{row['requests']:>10}{row['requests_per_second']:>10}{row['p50_ms']:>10}"
+                f"{row['p99_ms']:>10}{row['error_rate']:>9.2%}  {statuses}"
+            )
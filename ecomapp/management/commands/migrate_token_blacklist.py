@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_to_epoch
+
+from ecomapp.tokens import blacklist_jti
+
+
+class Command(BaseCommand):
+    help = "Copy still-valid blacklisted refresh tokens from the token_blacklist tables to the Redis blacklist."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows read or deleted per statement.")
+        parser.add_argument('--prune', action='store_true', help="Afterwards delete the copied rows and every expired outstanding token.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        copied = 0
+        last_id = 0
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=now).order_by('id')
+        while True:
+            rows = list(live.filter(id__gt=last_id).values_list('id', 'token__jti', 'token__expires_at')[:batch_size])
+            if not rows:
+                break
+            for _, jti, expires_at in rows:
+                blacklist_jti(jti, datetime_to_epoch(expires_at))
+            copied += len(rows)
+            last_id = rows[-1][0]
+        self.stdout.write(f"Copied {copied} blacklisted tokens to the cache.")
+
+        if options['prune']:
+            # Deleting an OutstandingToken cascades to its BlacklistedToken
+            stale = OutstandingToken.objects.filter(expires_at__lte=now) | OutstandingToken.objects.filter(blacklistedtoken__isnull=False)
+            pruned = 0
+            while True:
+                ids = list(stale.order_by('id').values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                OutstandingToken.objects.filter(id__in=ids).delete()
+                pruned += len(ids)
+            self.stdout.write(f"Pruned {pruned} outstanding tokens.")
+
+        self.stdout.write(self.style.SUCCESS("Token blacklist migrated."))
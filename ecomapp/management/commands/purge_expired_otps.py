@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecomapp.models import OTP
+
+
+class Command(BaseCommand):
+    help = "Delete expired OTP rows in bounded batches so the table and its indexes stay small."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per statement.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        batch_size, pause = options['batch_size'], options['pause']
+        cutoff = timezone.now() - timedelta(seconds=settings.OTP_TTL_SECONDS)
+        expired = OTP.objects.filter(created_at__lt=cutoff).order_by('created_at')
+
+        purged = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted, _ = OTP.objects.filter(id__in=ids).delete()
+            purged += deleted
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired OTP rows."))
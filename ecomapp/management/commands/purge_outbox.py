@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecomapp.email import purge_outbox
+
+
+class Command(BaseCommand):
+    help = "Delete sent and failed EmailOutbox messages older than --hours, in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help="Keep finished messages this long for inspection.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        purged = purge_outbox(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} finished outbox messages."))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecomapp.webhooks import purge_payment_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete applied PaymentEvent rows processed more than --days ago, in bounded batches. "
+        "Dead-lettered events are kept for inspection."
+    )
+
+    def add_arguments(self, parser):
+        # Longer than the gateway's redelivery window, so the unique event_id still drops redeliveries
+        parser.add_argument('--days', type=float, default=7, help="Keep applied events this long.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per statement.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        purged = purge_payment_events(cutoff, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} applied payment events."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecomapp.models import ServiceRegistry, rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every listing's RatingSummary from its Review rows, in batches of listings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Listings aggregated per transaction.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        rebuilt = 0
+
+        while True:
+            listing_ids = list(
+                ServiceRegistry.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not listing_ids:
+                break
+            with transaction.atomic():
+                rebuild_rating_summaries(listing_ids)
+            rebuilt += len(listing_ids)
+            last_id = listing_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {rebuilt} listings."))
@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import razorpay
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ecomapp.models import Payment
+from ecomapp.payments import GatewayUnavailable
+
+
+CHECKPOINT_KEY = 'reconcile_payments:last_id'
+
+
+class Command(BaseCommand):
+    help = (
+        "Settle Payment rows stuck in 'created' by asking the gateway for their order's payments. "
+        "Resumes after the last finished chunk unless --restart is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=15, help="Only payments created more than this many minutes ago.")
+        parser.add_argument('--chunk-size', type=int, default=200, help="Rows read, checked and written per chunk.")
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent gateway requests.")
+        parser.add_argument('--gateway', default='ecomapp.payments.get_gateway', help="Dotted path of a callable returning the gateway client.")
+        parser.add_argument('--restart', action='store_true', help="Ignore the saved checkpoint and start from the first stale payment.")
+
+    def handle(self, *args, **options):
+        gateway = import_string(options['gateway'])()
+        chunk_size = options['chunk_size']
+        last_id = 0 if options['restart'] else cache.get(CHECKPOINT_KEY, 0)
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+
+        stale = (
+            Payment.objects.filter(status='created', created_at__lt=cutoff, pk__gt=last_id)
+            .order_by('pk')
+            .only('pk', 'order_id', 'payment_id', 'status')
+            .iterator(chunk_size=chunk_size)
+        )
+
+        counts = {'paid': 0, 'failed': 0, 'unchanged': 0, 'error': 0}
+        checked = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while chunk := list(islice(stale, chunk_size)):
+                outcomes = list(pool.map(lambda payment: self.check(gateway, payment), chunk))
+                if all(outcome == 'error' for outcome in outcomes):
+                    raise CommandError(
+                        f"Gateway unavailable for a whole chunk; stopped after payment {last_id}. "
+                        "Run again to resume."
+                    )
+
+                changed = [payment for payment, outcome in zip(chunk, outcomes) if outcome in ('paid', 'failed')]
+                # Only rows still 'created' are written, so a concurrent verify-payment wins
+                Payment.objects.filter(status='created').bulk_update(changed, ['status', 'payment_id'])
+
+                for outcome in outcomes:
+                    counts[outcome] += 1
+                checked += len(chunk)
+                last_id = chunk[-1].pk
+                cache.set(CHECKPOINT_KEY, last_id, None)
+
+        cache.delete(CHECKPOINT_KEY)
+        elapsed = time.perf_counter() - started
+        rate = checked / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} payments in {elapsed:.1f}s ({rate:.1f}/s): "
+            f"{counts['paid']} paid, {counts['failed']} failed, "
+            f"{counts['unchanged']} unchanged, {counts['error']} gateway errors."
+        ))
+
+    def check(self, gateway, payment):
+        try:
+            response = gateway.fetch_order_payments(payment.order_id)
+        except (GatewayUnavailable, razorpay.errors.BadRequestError):
+            return 'error'
+
+        attempts = response.get('items', [])
+        captured = next((attempt for attempt in attempts if attempt.get('status') == 'captured'), None)
+        if captured:
+            payment.status = 'paid'
+            payment.payment_id = captured.get('id')
+            return 'paid'
+        if attempts and all(attempt.get('status') == 'failed' for attempt in attempts):
+            payment.status = 'failed'
+            return 'failed'
+        return 'unchanged'
@@ -0,0 +1,41 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecomapp.email import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued EmailOutbox messages in batches over one reused mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Messages sent per connection.")
+        parser.add_argument('--max-attempts', type=int, default=5, help="Attempts before a message is marked failed.")
+        parser.add_argument('--backoff', type=int, default=30, help="Seconds before the first retry, doubled on each attempt.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting once the queue is empty.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep between polls of an empty queue.")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = drain_outbox(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+                backoff_seconds=options['backoff'],
+            )
+            if stats['sent'] or stats['retried'] or stats['failed']:
+                self.report(stats)
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def report(self, stats):
+        line = f"sent={stats['sent']} retried={stats['retried']} failed={stats['failed']}"
+        latencies = stats['latencies']
+        if latencies:
+            line += (
+                f" enqueue-to-send p50={statistics.median(latencies):.3f}s"
+                f" max={max(latencies):.3f}s"
+            )
+        self.stdout.write(line)
@@ -1,10 +1,10 @@
 import random
-from .models import OTP
+from .otp import get_otp_backend
 
 def generate_otp():
     return str(random.randint(100000, 999999))
 
 def create_otp_for_user(user):
     otp_code = generate_otp()
-    OTP.objects.create(user=user, otp_code=otp_code)
+    get_otp_backend().store(user, otp_code)
     return otp_code
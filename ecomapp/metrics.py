@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from .cache import user_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Prometheus-style histogram kept in process memory.
+
+    An observation is one bisect and two additions under a lock, so it is
+    cheap enough to record on every request. Label sets are expected to be
+    few and bounded (URL name and method).
+    """
+
+    def __init__(self, name, help_text, buckets, labels=('endpoint', 'method')):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', "Request latency.", TIME_BUCKETS)
+DB_QUERIES = Histogram('http_request_db_queries', "Database queries per request.", (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+DB_TIME = Histogram('http_request_db_seconds', "Time spent in database queries per request.", TIME_BUCKETS)
+SERIALIZATION_TIME = Histogram('http_response_serialization_seconds', "Time spent rendering the response body.", TIME_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', "Response body size.", (256, 1024, 4096, 16384, 65536, 262144, 1048576))
+HISTOGRAMS = [REQUEST_LATENCY, DB_QUERIES, DB_TIME, SERIALIZATION_TIME, RESPONSE_SIZE]
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'serialization_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serialization_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.queries += 1
+
+
+_current_stats = ContextVar('request_stats', default=None)
+
+
+def get_query_budget(view_class, method):
+    """
+    Query budget a view declares for an HTTP method. Views set `query_budget`
+    to an int, or to a dict keyed by method; the budget must not depend on
+    how many rows the tables hold.
+    """
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+# Any other method a client sends is recorded as 'other', so it cannot add series
+METHOD_LABELS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+
+class MetricsMiddleware:
+    """Record latency, query count and time, serialization time and response size per URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        labels = (match.url_name or match.view_name if match else 'unmatched', request.method if request.method in METHOD_LABELS else 'other')
+        budget = get_query_budget(getattr(match.func, 'view_class', None), request.method) if match else None
+        if budget is not None and stats.queries > budget:
+            logger.warning("%s %s ran %d queries, its budget is %d", request.method, request.path, stats.queries, budget)
+        REQUEST_LATENCY.observe(labels, elapsed)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_TIME.observe(labels, stats.query_time)
+        if stats.serialization_time:
+            SERIALIZATION_TIME.observe(labels, stats.serialization_time)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(labels, len(response.content))
+        return response
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its rendering time to MetricsMiddleware."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.serialization_time += time.perf_counter() - start
+
+
+def render_metrics():
+    """Every histogram of this process plus the auth user cache counters, in Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    stats = user_cache.stats()
+    lines.append("# HELP auth_user_cache_requests_total Authenticated user lookups by cache outcome.")
+    lines.append("# TYPE auth_user_cache_requests_total counter")
+    for outcome in ('hits_local', 'hits_shared', 'misses'):
+        lines.append(f'auth_user_cache_requests_total{{outcome="{outcome}"}} {stats[outcome]}')
+    lines.append("# HELP auth_user_cache_local_entries Users held in this process's cache tier.")
+    lines.append("# TYPE auth_user_cache_local_entries gauge")
+    lines.append(f"auth_user_cache_local_entries {stats['local_entries']}")
+    return "\n".join(lines) + "\n"
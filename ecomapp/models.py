@@ -1,11 +1,14 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager,PermissionsMixin
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.conf import settings
 import uuid
+from .cache import bump_version, availability_namespace, user_cache, CATALOG_NAMESPACE
 
 
 
@@ -16,7 +19,27 @@ def validate_file_size(file):
 
 
 
-class CustomUserManager(BaseUserManager):
+class RegisterQuerySet(models.QuerySet):
+    update_batch_size = 1000
+
+    def update(self, **kwargs):
+        # Bulk updates (e.g. deactivating users) skip post_save, so cached users
+        # are dropped here: one batch of primary keys at a time, after commit
+        rows = 0
+        last_pk = 0
+        with transaction.atomic(using=self.db):
+            while True:
+                user_ids = list(
+                    self.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:self.update_batch_size]
+                )
+                if not user_ids:
+                    return rows
+                rows += self.model._base_manager.using(self.db).filter(pk__in=user_ids).update(**kwargs)
+                transaction.on_commit(lambda user_ids=user_ids: user_cache.delete_many(user_ids), using=self.db)
+                last_pk = user_ids[-1]
+
+
+class CustomUserManager(BaseUserManager.from_queryset(RegisterQuerySet)):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
@@ -58,6 +81,12 @@ class Register(AbstractBaseUser,PermissionsMixin):
         Profile.objects.filter(user=self).delete()
       
         super().delete(*args, **kwargs)
+
+
+@receiver([post_save, post_delete], sender=Register)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # After commit, or a concurrent request could cache the row being replaced
+    transaction.on_commit(lambda pk=instance.pk: user_cache.delete(pk))
     
  
 
@@ -66,6 +95,12 @@ class OTP(models.Model):
     otp_code = models.CharField(max_length=6)  # OTP code
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='otp_user_created_idx'),
+            models.Index(fields=['created_at'], name='otp_created_idx'),  # Expiry purge
+        ]
+
     def __str__(self):
         return f"OTP for {self.user.email}"
     
@@ -73,6 +108,30 @@ class OTP(models.Model):
         """Override delete to make sure the OTP is deleted after verification"""
         super().delete(*args, **kwargs)
 
+class EmailOutbox(models.Model):
+    """Mail queued by request handlers and delivered in batches by `manage.py send_outbox`."""
+    STATUS_CHOICES = [('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(null=True, blank=True)  # Not delivered after this, e.g. an OTP past its TTL
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='emailoutbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
+
 class Profile(models.Model):
     user = models.OneToOneField(Register, on_delete=models.CASCADE) 
     full_name = models.CharField(max_length=255)
@@ -125,6 +184,13 @@ class Subservices(models.Model):
     description = models.TextField()
 
 
+@receiver([post_save, post_delete], sender=Services)
+@receiver([post_save, post_delete], sender=Subservices)
+def invalidate_service_catalog(sender, **kwargs):
+    # After commit, or a concurrent request could cache the old catalog under the new version
+    transaction.on_commit(lambda: bump_version(CATALOG_NAMESPACE))
+
+
 
 
 class EmployeeRegistration(models.Model):
@@ -139,11 +205,20 @@ class EmployeeRegistration(models.Model):
 
 class ServiceRegistry(models.Model):
     employee = models.ForeignKey('EmployeeRegistration', on_delete=models.CASCADE)
-    service = models.ForeignKey('Services', on_delete=models.CASCADE)
+    service = models.ForeignKey('Services', on_delete=models.CASCADE, db_index=False)  # Led by registry_service_idx
     min_price = models.PositiveIntegerField()
     max_price = models.PositiveIntegerField()
     description = models.TextField()
 
+    class Meta:
+        # Listing search: keys match the filter/sort columns, the included
+        # prices let the budget check run on an index only scan
+        indexes = [
+            models.Index(fields=['service', 'id'], include=['min_price', 'max_price'], name='registry_service_idx'),
+            models.Index(fields=['service', 'min_price', 'id'], include=['max_price'], name='registry_service_price_idx'),
+            models.Index(fields=['min_price', 'id'], include=['max_price', 'service'], name='registry_price_idx'),
+        ]
+
     def __str__(self):
         return f"{self.employee.name} - {self.service.title}"
 
@@ -158,9 +233,39 @@ class ServiceRequest(models.Model):
     to_time = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     register = models.ForeignKey(Register, on_delete=models.CASCADE,null=True,blank=True)
+    # Copied from service_registry so overlap checks can be made per provider
+    employee = models.ForeignKey(EmployeeRegistration, on_delete=models.CASCADE, null=True, blank=True, editable=False, related_name='service_requests')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='servicerequest_created_idx'),
+            models.Index(fields=['employee', 'from_time', 'to_time'], name='servicerequest_provider_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_registry_id = instance.__dict__.get('service_registry_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        self._previous_employee_id = self.employee_id
+        # Only look the provider up when it is unknown or the listing changed
+        if self.employee_id is None or self.service_registry_id != getattr(self, '_loaded_registry_id', None):
+            self.employee_id = self.service_registry.employee_id
+        super().save(*args, **kwargs)
+        self._loaded_registry_id = self.service_registry_id
+
+
+@receiver([post_save, post_delete], sender=ServiceRequest)
+def invalidate_provider_availability(sender, instance, **kwargs):
+    # After commit, or a concurrent read could cache free slots that miss this booking
+    for employee_id in {instance.employee_id, getattr(instance, '_previous_employee_id', None)}:
+        if employee_id:
+            transaction.on_commit(lambda employee_id=employee_id: bump_version(availability_namespace(employee_id)))
     
     
     
@@ -172,13 +277,25 @@ class BookingList(models.Model):
     
     service_request = models.ForeignKey('ServiceRequest', on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-booking_date', '-id'], name='bookinglist_date_idx'),
+            models.Index(fields=['register', '-booking_date', '-id'], name='bookinglist_register_date_idx'),
+        ]
+        constraints = [
+            # Run `manage.py dedupe_bookings` before migrating a table that has duplicates
+            models.UniqueConstraint(fields=['service_request'], name='bookinglist_unique_request'),
+        ]
+
     def __str__(self):
         return f"Booking for {self.register.name if self.register else 'Unknown'} on {self.booking_date}"
     
     
 @receiver(post_save, sender=ServiceRequest,)
-def create_booking_list(sender, instance, **kwargs):
-   
+def create_booking_list(sender, instance, created, **kwargs):
+    # Bookings are written once, in the transaction that creates the request
+    if not created:
+        return
     BookingList.objects.create(
         register=instance.register,  
         booking_date=instance.created_at,  
@@ -195,6 +312,112 @@ class Review(models.Model):
     rating = models.IntegerField()
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='review_created_idx'),
+            models.Index(fields=['service', '-created_at', '-id'], name='review_listing_created_idx'),
+        ]
+
+
+class RatingSummary(models.Model):
+    """Review aggregates of a ServiceRegistry listing, kept current by the Review signals."""
+    listing = models.OneToOneField(ServiceRegistry, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.IntegerField(default=0)
+    average_rating = models.FloatField(null=True, blank=True)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-average_rating', '-listing'], name='ratingsummary_rating_idx'),
+        ]
+
+    def __str__(self):
+        return f"Rating summary for listing {self.listing_id}"
+
+
+def apply_rating(listing_id, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one rating with a single UPDATE."""
+    count = F('review_count') + sign
+    total = F('rating_total') + sign * rating
+    changes = {
+        'review_count': count,
+        'rating_total': total,
+        'average_rating': Cast(total, FloatField()) / NullIf(count, 0),
+    }
+    if 1 <= rating <= 5:
+        changes[f'stars_{rating}'] = F(f'stars_{rating}') + sign
+
+    with transaction.atomic():
+        updated = RatingSummary.objects.filter(listing_id=listing_id).update(**changes)
+        # Removals never create a row: a missing summary means the listing is
+        # being deleted along with its reviews, or needs a rebuild anyway.
+        if not updated and sign > 0:
+            RatingSummary.objects.bulk_create([RatingSummary(listing_id=listing_id)], ignore_conflicts=True)
+            RatingSummary.objects.filter(listing_id=listing_id).update(**changes)
+
+
+RATING_STAR_FIELDS = [f'stars_{stars}' for stars in range(1, 6)]
+
+
+def rebuild_rating_summaries(listing_ids, using='default'):
+    """Recompute the RatingSummary of each listing from its Review rows."""
+    aggregates = {
+        row['service_id']: row
+        for row in Review.objects.using(using).filter(service_id__in=listing_ids).values('service_id').annotate(
+            review_count=Count('id'),
+            rating_total=Sum('rating'),
+            **{field: Count('id', filter=Q(rating=stars)) for stars, field in enumerate(RATING_STAR_FIELDS, start=1)},
+        )
+    }
+
+    summaries = []
+    for listing_id in listing_ids:
+        row = aggregates.get(listing_id, {})
+        count = row.get('review_count', 0)
+        total = row.get('rating_total') or 0
+        summaries.append(RatingSummary(
+            listing_id=listing_id,
+            review_count=count,
+            rating_total=total,
+            average_rating=total / count if count else None,
+            **{field: row.get(field, 0) for field in RATING_STAR_FIELDS},
+        ))
+
+    RatingSummary.objects.using(using).bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['listing'],
+        update_fields=['review_count', 'rating_total', 'average_rating', *RATING_STAR_FIELDS],
+    )
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = Review.objects.filter(pk=instance.pk).values_list('service_id', 'rating').first()
+
+
+@receiver(post_save, sender=Review)
+def update_rating_summary(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous == (instance.service_id, instance.rating):
+        return
+    with transaction.atomic():
+        if previous:
+            apply_rating(previous[0], previous[1], -1)
+        apply_rating(instance.service_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def remove_rating_from_summary(sender, instance, **kwargs):
+    apply_rating(instance.service_id, instance.rating, -1)
     
     
     
@@ -212,4 +435,30 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Payment {self.reference_number} for Order {self.order_id}"
\ No newline at end of file
+        return f"Payment {self.reference_number} for Order {self.order_id}"
+
+
+class PaymentEvent(models.Model):
+    """Gateway webhook event, queued until `manage.py apply_payment_events` applies it to its Payment."""
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    order_id = models.CharField(max_length=100)
+    payment_id = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=[('paid', 'Paid'), ('failed', 'Failed')])
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Events for an order with no Payment row yet are retried with backoff,
+    # then dead-lettered: processed without being applied
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    dead_lettered = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(processed_at__isnull=True), name='paymentevent_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for Order {self.order_id}"
+
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OTP, Register
+
+
+class DatabaseOTPBackend:
+    """OTP rows in the database; the latest code of a user is the valid one."""
+
+    def store(self, user, otp_code):
+        OTP.objects.create(user=user, otp_code=otp_code)
+
+    def verify(self, email, otp_code):
+        # One statement: delete all of the user's codes if their latest code
+        # matches and is unexpired; a deleted row means the OTP was valid.
+        otp_table = connection.ops.quote_name(OTP._meta.db_table)
+        user_table = connection.ops.quote_name(Register._meta.db_table)
+        cutoff = timezone.now() - timedelta(seconds=settings.OTP_TTL_SECONDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {otp_table}
+                WHERE user_id = (SELECT id FROM {user_table} WHERE email = %s)
+                  AND EXISTS (
+                    SELECT 1 FROM {otp_table} latest
+                    WHERE latest.user_id = {otp_table}.user_id
+                      AND latest.otp_code = %s
+                      AND latest.created_at >= %s
+                      AND NOT EXISTS (
+                        SELECT 1 FROM {otp_table} newer
+                        WHERE newer.user_id = latest.user_id AND newer.created_at > latest.created_at
+                      )
+                  )
+                """,
+                [email, otp_code, cutoff],
+            )
+            return cursor.rowcount > 0
+
+
+class CacheOTPBackend:
+    """
+    One key per email in the cache, expiring after OTP_TTL_SECONDS.
+
+    On django_redis the check and the delete run as one Lua script, so a code
+    can be consumed exactly once; other caches fall back to get + delete.
+    """
+    cache_alias = 'default'
+    consume_script = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) end "
+        "return 0"
+    )
+
+    def __init__(self):
+        self.cache = caches[self.cache_alias]
+
+    def store(self, user, otp_code):
+        key = self.key(user.email)
+        redis = self.redis()
+        if redis is not None:
+            redis.set(key, otp_code, ex=settings.OTP_TTL_SECONDS)
+        else:
+            self.cache.set(key, otp_code, settings.OTP_TTL_SECONDS)
+
+    def verify(self, email, otp_code):
+        key = self.key(email)
+        redis = self.redis()
+        if redis is not None:
+            return bool(redis.eval(self.consume_script, 1, key, otp_code))
+        if self.cache.get(key) != otp_code:
+            return False
+        self.cache.delete(key)
+        return True
+
+    def key(self, email):
+        # Raw redis calls bypass the cache's key function, so apply it here
+        return self.cache.make_key(f"otp:{email}")
+
+    def redis(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection(self.cache_alias)
+        except (ImportError, NotImplementedError):
+            return None
+
+
+@lru_cache(maxsize=None)
+def get_otp_backend():
+    return import_string(settings.OTP_BACKEND)()
@@ -1,5 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class CustomPagination(PageNumberPagination):
     page_size = 5  # Default page size
@@ -15,4 +24,158 @@ class CustomPagination(PageNumberPagination):
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data,
-        })
\ No newline at end of file
+        })
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a unique ordering such as ('-booking_date', '-id').
+
+    Every page is one index range scan of page_size + 1 rows, however deep the
+    client has paged, and no COUNT(*) runs unless the client asks for a total
+    with ?total=estimate (planner statistics) or ?total=exact.
+    Views pass the ordering to the constructor; the last field must be unique
+    and none of them nullable.
+    """
+    ordering = ('-id',)
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.total = self.get_total(queryset, request)
+
+        position = self.decode_cursor(request, queryset)
+        rows = self.get_rows(queryset, position, self.page_size + 1)
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.get_position(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_querysets(self, queryset, position):
+        """Queries that read the rows after `position`, in order; the page is filled from them in turn."""
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        return [queryset]
+
+    def get_rows(self, queryset, position, limit):
+        rows = []
+        for part in self.get_querysets(queryset, position):
+            rows += part[:limit - len(rows)]
+            if len(rows) == limit:
+                break
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'total_items': self.total,
+            'page_size': self.page_size,
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_total(self, queryset, request):
+        mode = request.query_params.get(self.total_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def get_position(self, row):
+        fields = [name.lstrip('-') for name in self.ordering]
+        if isinstance(row, dict):
+            values = [row[name] for name in fields]
+        else:
+            values = [getattr(row, name) for name in fields]
+        return [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+
+    def get_position_filter(self, position):
+        # (a, b) after (x, y)  ==  a > x OR (a = x AND b > y), plus a leading
+        # a >= x bound so the database can start an index range scan at x.
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, position):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        first = self.ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': position[0]}) & condition
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode('ascii')
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [self.to_python(queryset, name.lstrip('-'), value) for name, value in zip(self.ordering, position)]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, queryset, lookup, value):
+        """Cursor value converted by the model field or annotation it was read from."""
+        if not isinstance(value, (str, int, float)):
+            raise TypeError(f"Unsupported cursor value {value!r}")
+        if lookup in queryset.query.annotations:
+            return queryset.query.annotations[lookup].output_field.to_python(value)
+        model = queryset.model
+        for name in lookup.split(LOOKUP_SEP):
+            field = model._meta.get_field(name)
+            if field.is_relation:
+                model = field.related_model
+        if field.is_relation:
+            field = field.target_field
+        return field.to_python(value)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+
+def estimate_count(queryset):
+    """
+    Row estimate from the PostgreSQL planner instead of a full COUNT(*).
+    Backends without planner statistics (SQLite) fall back to an exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
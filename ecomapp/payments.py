@@ -0,0 +1,158 @@
+import threading
+import time
+
+import razorpay
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class GatewayUnavailable(Exception):
+    """The payment gateway failed, timed out, or its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the gateway is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are refused for `reset_timeout` seconds; then one trial call is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class PaymentGateway:
+    """Razorpay client over a pooled session, with strict timeouts and a circuit breaker."""
+
+    failure_errors = (
+        requests.RequestException,
+        razorpay.errors.GatewayError,
+        razorpay.errors.ServerError,
+        ValueError,  # Unparseable gateway response
+    )
+
+    def __init__(self, key_id, key_secret, timeout=(3.05, 10), pool_size=10, breaker=None, base_url=None):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        options = {'base_url': base_url} if base_url else {}
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret), **options)
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+
+    def call(self, func, *args):
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Payment gateway is unavailable, try again shortly.")
+        try:
+            result = func(*args, timeout=self.timeout)
+        except razorpay.errors.BadRequestError:
+            # The gateway answered, the request itself was rejected
+            self.breaker.record_success()
+            raise
+        except self.failure_errors as exc:
+            self.breaker.record_failure()
+            raise GatewayUnavailable("Payment gateway request failed.") from exc
+        except Exception:
+            # Anything unexpected still ends a half-open trial, or the breaker stays stuck
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def create_order(self, data):
+        return self.call(self.client.order.create, data)
+
+    def fetch_order_payments(self, order_id):
+        return self.call(self.client.order.payments, order_id)
+
+    def verify_payment_signature(self, params):
+        # Local HMAC check, no network call
+        return self.client.utility.verify_payment_signature(params)
+
+    def verify_webhook_signature(self, body, signature, secret):
+        return self.client.utility.verify_webhook_signature(body, signature, secret)
+
+
+class AsyncPaymentGateway:
+    """Awaitable wrapper for ASGI code; gateway calls run in worker threads off the event loop."""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    async def create_order(self, data):
+        return await sync_to_async(self.gateway.create_order, thread_sensitive=False)(data)
+
+    async def fetch_order_payments(self, order_id):
+        return await sync_to_async(self.gateway.fetch_order_payments, thread_sensitive=False)(order_id)
+
+    def verify_payment_signature(self, params):
+        return self.gateway.verify_payment_signature(params)
+
+    def verify_webhook_signature(self, body, signature, secret):
+        return self.gateway.verify_webhook_signature(body, signature, secret)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide gateway, so the connection pool and breaker state are shared."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = PaymentGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    timeout=settings.RAZORPAY_TIMEOUT,
+                    pool_size=settings.RAZORPAY_POOL_SIZE,
+                    breaker=CircuitBreaker(settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_RESET),
+                    base_url=settings.RAZORPAY_BASE_URL,
+                )
+    return _gateway
+
+
+def get_async_gateway():
+    return AsyncPaymentGateway(get_gateway())
@@ -0,0 +1,157 @@
+import logging
+import re
+
+from django.db import DatabaseError, connections, transaction
+
+from .models import EmployeeRegistration, ServiceRegistry, Services, Subservices
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'ecomapp_search'
+SEARCH_INDEX = 'search_vector_idx'
+TEXT_CONFIG = 'english'
+
+# (kind, model, service id column, title column or None); the FTS5 rowid
+# of a document is object_id * KINDS + position, so one row is updated in place.
+DOCUMENTS = [
+    ('service', Services, 'id', 'title'),
+    ('subservice', Subservices, 'services_id', 'title'),
+    ('listing', ServiceRegistry, 'service_id', None),
+]
+KINDS = len(DOCUMENTS)
+
+
+def _tables():
+    return [(kind, position, model._meta.db_table, service, title) for position, (kind, model, service, title) in enumerate(DOCUMENTS)]
+
+
+def _label_sql(hit):
+    # Listings have no title of their own, show them as "<service> by <provider>"
+    return (
+        f"CASE WHEN {hit}.kind = 'listing' THEN listing_service.title || ' by ' || provider.name ELSE {hit}.title END"
+    )
+
+
+def _label_joins(hit):
+    return (
+        f"LEFT JOIN {ServiceRegistry._meta.db_table} listing ON {hit}.kind = 'listing' AND listing.id = {hit}.object_id "
+        f"LEFT JOIN {Services._meta.db_table} listing_service ON listing_service.id = listing.service_id "
+        f"LEFT JOIN {EmployeeRegistration._meta.db_table} provider ON provider.id = listing.employee_id"
+    )
+
+
+def search_sql(vendor):
+    """SQL taking (query, limit) and returning (kind, id, service, title, description, rank), best match first."""
+    label = _label_sql('hit')
+    joins = _label_joins('hit')
+    if vendor == 'postgresql':
+        branches = " UNION ALL ".join(
+            f"SELECT '{kind}' AS kind, id AS object_id, {service} AS service_id, "
+            f"{title or 'NULL'} AS title, description, ts_rank(search_vector, terms.query) AS rank "
+            f"FROM {table}, terms WHERE search_vector @@ terms.query"
+            for kind, _, table, service, title in _tables()
+        )
+        return (
+            f"WITH terms AS (SELECT websearch_to_tsquery('{TEXT_CONFIG}', %s) AS query) "
+            f"SELECT hit.kind, hit.object_id, hit.service_id, {label}, hit.description, hit.rank "
+            f"FROM ({branches} ORDER BY rank DESC, kind, object_id LIMIT %s) hit {joins} "
+            f"ORDER BY hit.rank DESC, hit.kind, hit.object_id"
+        )
+    kinds = " ".join(f"WHEN {position} THEN '{kind}'" for kind, position, *_ in _tables())
+    # bm25() weighs the columns in order: service_id, title, description
+    return (
+        f"SELECT hit.kind, hit.object_id, hit.service_id, {label}, hit.description, hit.rank FROM ("
+        f"SELECT CASE rowid %% {KINDS} {kinds} END AS kind, rowid / {KINDS} AS object_id, service_id, title, description, "
+        f"-bm25({SEARCH_TABLE}, 0.0, 4.0, 1.0) AS rank "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank DESC, rowid LIMIT %s"
+        f") hit {joins} ORDER BY hit.rank DESC, hit.kind, hit.object_id"
+    )
+
+
+def fts5_query(text):
+    """Plain words to an FTS5 query matching all of them, with FTS5 syntax characters dropped."""
+    words = re.findall(r'\w+', text)
+    return " ".join(f'"{word}"' for word in words)
+
+
+def search(text, limit=20, using='default'):
+    """Services, subservices and listings matching `text`, ranked by relevance."""
+    connection = connections[using]
+    query = text if connection.vendor == 'postgresql' else fts5_query(text)
+    if not query:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(search_sql(connection.vendor), [query, limit])
+        rows = cursor.fetchall()
+    return [
+        {'type': kind, 'id': object_id, 'service': service_id, 'title': title, 'description': description, 'rank': round(rank, 6)}
+        for kind, object_id, service_id, title, description, rank in rows
+    ]
+
+
+def _postgres_statements():
+    statements = []
+    for _, _, table, _, title in _tables():
+        weighted = f"setweight(to_tsvector('{TEXT_CONFIG}', coalesce(description, '')), 'B')"
+        if title:
+            weighted = f"setweight(to_tsvector('{TEXT_CONFIG}', coalesce({title}, '')), 'A') || {weighted}"
+        statements.append(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({weighted}) STORED"
+        )
+        statements.append(f"CREATE INDEX IF NOT EXISTS {table}_{SEARCH_INDEX} ON {table} USING gin (search_vector)")
+    return statements
+
+
+def _sqlite_statements():
+    statements = [
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        f"service_id UNINDEXED, title, description, tokenize='porter unicode61 remove_diacritics 2')"
+    ]
+    for kind, position, table, service, title in _tables():
+        rowid = f"id * {KINDS} + {position}"
+        title_column = title or 'NULL'
+        statements.append(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, service_id, title, description) "
+            f"SELECT {rowid}, {service}, {title_column}, description FROM {table}"
+        )
+        new = {'rowid': f"new.{rowid}", 'service': f"new.{service}", 'title': f"new.{title}" if title else 'NULL'}
+        statements += [
+            f"CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {SEARCH_TABLE} (rowid, service_id, title, description) "
+            f"VALUES ({new['rowid']}, {new['service']}, {new['title']}, new.description); END",
+            f"CREATE TRIGGER {table}_search_update AFTER UPDATE ON {table} BEGIN "
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.{rowid}; "
+            f"INSERT INTO {SEARCH_TABLE} (rowid, service_id, title, description) "
+            f"VALUES ({new['rowid']}, {new['service']}, {new['title']}, new.description); END",
+            f"CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.{rowid}; END",
+        ]
+    return statements
+
+
+def install_search_index(sender, using, **kwargs):
+    """
+    post_migrate hook: on PostgreSQL add a generated, GIN-indexed
+    search_vector column to each searchable table; on SQLite build an FTS5
+    table from the current rows and keep it current with triggers.
+    """
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    if any(model._meta.db_table not in tables for _, model, _, _ in DOCUMENTS):
+        return
+    if connection.vendor == 'postgresql':
+        statements = _postgres_statements()
+    elif connection.vendor == 'sqlite':
+        if SEARCH_TABLE in tables:
+            return
+        statements = _sqlite_statements()
+    else:
+        return
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    except DatabaseError as exc:
+        logger.warning("Could not install the search index, /search/ will fail: %s", exc)
@@ -0,0 +1,412 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import CATALOG_NAMESPACE, availability_namespace, bump_version
+from .models import (
+    BookingList,
+    EmployeeRegistration,
+    Payment,
+    RatingSummary,
+    Register,
+    Review,
+    ServiceRegistry,
+    ServiceRequest,
+    Services,
+    Subservices,
+    rebuild_rating_summaries,
+)
+
+
+SEED_PASSWORD = 'seed-password'
+
+DEFAULT_VOLUMES = {
+    'services': 20,
+    'subservices': 100,
+    'providers': 200,
+    'listings': 600,
+    'users': 100,
+    'requests': 2000,
+    'reviews': 2000,
+    'payments': 500,
+}
+
+SERVICE_NAMES = [
+    'AC repair', 'Plumbing', 'Electrician', 'Carpentry', 'House cleaning', 'Pest control', 'Painting',
+    'Appliance repair', 'Water purifier service', 'Salon at home', 'Laundry', 'Gardening', 'Car wash',
+    'Packers and movers', 'CCTV installation', 'Interior design', 'Home tutoring', 'Fitness trainer',
+]
+TASK_NAMES = ['installation', 'repair', 'servicing', 'inspection', 'deep cleaning', 'replacement', 'maintenance']
+FIRST_NAMES = ['Arjun', 'Meera', 'Ravi', 'Anita', 'Kiran', 'Lakshmi', 'Vishnu', 'Divya', 'Rahul', 'Sneha', 'Manoj', 'Priya']
+LAST_NAMES = ['Nair', 'Menon', 'Kumar', 'Pillai', 'Sharma', 'Reddy', 'Iyer', 'Das', 'Thomas', 'Joseph']
+COMMENTS = ['Quick and professional.', 'Arrived on time.', 'Fair price for the work.', 'Would book again.',
+            'Took longer than promised.', 'Left the place clean.', 'Fixed it on the first visit.']
+RATING_WEIGHTS = [5, 7, 15, 33, 40]  # 1 to 5 stars
+PAYMENT_STATUSES = (['paid'] * 7) + (['created'] * 2) + ['failed']
+
+
+def spread(index, count, salt=0):
+    """Deterministic, well-mixed index in range(count); lets related tables agree without lookups."""
+    return (index * 2654435761 + salt * 40503) % count
+
+
+class Plan:
+    """
+    Row counts and id ranges of one seeding run. Every id is assigned up
+    front from the current maximum of its table, so any worker can generate
+    any slice of any table and still point at the right foreign keys.
+    """
+
+    def __init__(self, volumes, random_seed=0, using='default'):
+        self.volumes = volumes
+        self.random_seed = random_seed
+        self.using = using
+        self.now = timezone.now()
+        self.password = make_password(SEED_PASSWORD)  # Hashed once, shared by every seeded user
+        self.offsets = {
+            name: model.objects.using(using).aggregate(last=Max('pk'))['last'] or 0
+            for name, model in MODELS.items() if name != 'ratingsummaries'
+        }
+        self.offsets['ratingsummaries'] = self.offsets['listings']
+        self.counts = {**volumes, 'bookings': volumes['requests'], 'ratingsummaries': volumes['listings']}
+        # Providers without a listing take no bookings
+        self.bookable_providers = min(volumes['providers'], volumes['listings'])
+
+    def rng(self, table, start):
+        return random.Random(f'{self.random_seed}:{table}:{start}')
+
+    def user_id(self, index, salt=0):
+        return self.offsets['users'] + spread(index, self.volumes['users'], salt) + 1
+
+    def request_slot(self, index):
+        """(listing id, employee id, slot number) of the index-th request; slots of one provider never overlap."""
+        provider = index % self.bookable_providers
+        slot = index // self.bookable_providers
+        # Listings of provider p are p, p + providers, p + 2 * providers, ...
+        listings = (self.volumes['listings'] - 1 - provider) // self.volumes['providers'] + 1
+        listing = provider + self.volumes['providers'] * (slot % listings)
+        return self.offsets['listings'] + listing + 1, self.offsets['providers'] + provider + 1, slot
+
+    def request_created_at(self, index):
+        return self.now - timedelta(days=180) + timedelta(minutes=spread(index, 180 * 24 * 60))
+
+
+def services_rows(plan, start, stop):
+    for index in range(start, stop):
+        name = SERVICE_NAMES[index % len(SERVICE_NAMES)]
+        if index >= len(SERVICE_NAMES):
+            name = f'{name} {index // len(SERVICE_NAMES) + 1}'
+        yield (plan.offsets['services'] + index + 1, name, None, f'{name} by verified professionals at your doorstep.', 'Active')
+
+
+def subservices_rows(plan, start, stop):
+    for index in range(start, stop):
+        service = index % plan.volumes['services']
+        task = TASK_NAMES[(index // plan.volumes['services']) % len(TASK_NAMES)]
+        yield (
+            plan.offsets['subservices'] + index + 1,
+            f'{task.capitalize()} {index + 1}',
+            plan.offsets['services'] + service + 1,
+            None,
+            f'{task.capitalize()} for service {service + 1}.',
+        )
+
+
+def providers_rows(plan, start, stop):
+    rng = plan.rng('providers', start)
+    for index in range(start, stop):
+        yield (
+            plan.offsets['providers'] + index + 1,
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            rng.randint(21, 60),
+            f'9{index:09d}'[-10:],
+            plan.now - timedelta(days=rng.randint(30, 900)),
+        )
+
+
+def listings_rows(plan, start, stop):
+    rng = plan.rng('listings', start)
+    for index in range(start, stop):
+        min_price = rng.randrange(200, 5000, 50)
+        service = spread(index, plan.volumes['services'], salt=1)
+        yield (
+            plan.offsets['listings'] + index + 1,
+            plan.offsets['providers'] + index % plan.volumes['providers'] + 1,
+            plan.offsets['services'] + service + 1,
+            min_price,
+            min_price + rng.randrange(100, 5000, 50),
+            f'{rng.randint(1, 20)} years of experience in {SERVICE_NAMES[service % len(SERVICE_NAMES)].lower()}.',
+        )
+
+
+def users_rows(plan, start, stop):
+    rng = plan.rng('users', start)
+    for index in range(start, stop):
+        user_id = plan.offsets['users'] + index + 1
+        yield (
+            user_id, plan.password, None, False,
+            f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            f'user{user_id}@seed.invalid',
+            f'8{index:09d}'[-10:],
+            plan.now - timedelta(days=rng.randint(0, 900)),
+            True, False,
+        )
+
+
+def requests_rows(plan, start, stop):
+    rng = plan.rng('requests', start)
+    base = plan.now - timedelta(days=90)
+    for index in range(start, stop):
+        listing_id, employee_id, slot = plan.request_slot(index)
+        from_time = base + timedelta(hours=3 * slot)
+        yield (
+            plan.offsets['requests'] + index + 1,
+            listing_id,
+            f'{TASK_NAMES[index % len(TASK_NAMES)].capitalize()} visit',
+            rng.choice(COMMENTS),
+            from_time,
+            from_time + timedelta(minutes=rng.choice([30, 60, 90, 120])),
+            plan.request_created_at(index),
+            plan.user_id(index),
+            employee_id,
+        )
+
+
+def bookings_rows(plan, start, stop):
+    for index in range(start, stop):
+        yield (
+            plan.offsets['bookings'] + index + 1,
+            plan.user_id(index),
+            plan.request_created_at(index),
+            plan.offsets['requests'] + index + 1,
+        )
+
+
+def reviews_rows(plan, start, stop):
+    rng = plan.rng('reviews', start)
+    for index in range(start, stop):
+        yield (
+            plan.offsets['reviews'] + index + 1,
+            plan.user_id(index, salt=2),
+            plan.offsets['listings'] + spread(index, plan.volumes['listings'], salt=3) + 1,
+            rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+            rng.choice(COMMENTS),
+            plan.now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+        )
+
+
+def payments_rows(plan, start, stop):
+    rng = plan.rng('payments', start)
+    for index in range(start, stop):
+        payment_id = plan.offsets['payments'] + index + 1
+        status = rng.choice(PAYMENT_STATUSES)
+        yield (
+            payment_id,
+            f'order_seed_{payment_id}',
+            f'pay_seed_{payment_id}' if status == 'paid' else None,
+            plan.user_id(index, salt=4),
+            plan.offsets['providers'] + spread(index, plan.volumes['providers'], salt=5) + 1,
+            float(rng.randrange(200, 10000, 50)),
+            status,
+            f'seed-{payment_id}',
+            plan.now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+        )
+
+
+MODELS = {
+    'services': Services,
+    'subservices': Subservices,
+    'providers': EmployeeRegistration,
+    'listings': ServiceRegistry,
+    'users': Register,
+    'requests': ServiceRequest,
+    'bookings': BookingList,
+    'reviews': Review,
+    'payments': Payment,
+    'ratingsummaries': RatingSummary,
+}
+
+# (generator, column attnames in the order the generator yields them)
+TABLES = {
+    'services': (services_rows, ['id', 'title', 'image', 'description', 'status']),
+    'subservices': (subservices_rows, ['id', 'title', 'services_id', 'image', 'description']),
+    'providers': (providers_rows, ['id', 'name', 'age', 'phone_number', 'created_at']),
+    'listings': (listings_rows, ['id', 'employee_id', 'service_id', 'min_price', 'max_price', 'description']),
+    'users': (users_rows, ['id', 'password', 'last_login', 'is_superuser', 'name', 'email', 'phone_number', 'created_at', 'is_active', 'is_staff']),
+    'requests': (requests_rows, ['id', 'service_registry_id', 'title', 'description', 'from_time', 'to_time', 'created_at', 'register_id', 'employee_id']),
+    'bookings': (bookings_rows, ['id', 'register_id', 'booking_date', 'service_request_id']),
+    'reviews': (reviews_rows, ['id', 'user_id', 'service_id', 'rating', 'comment', 'created_at']),
+    'payments': (payments_rows, ['id', 'order_id', 'payment_id', 'user_id', 'employee_id', 'amount', 'status', 'reference_number', 'created_at']),
+}
+
+# Tables of a stage only reference tables of earlier stages, so a stage's
+# chunks can be written in any order and by any number of workers.
+STAGES = [
+    ['services', 'providers', 'users'],
+    ['subservices', 'listings'],
+    ['requests', 'reviews', 'payments'],
+    ['bookings', 'ratingsummaries'],
+]
+
+
+def csv_field(value):
+    """One COPY CSV field: NULL is an unquoted empty field, every text value is quoted."""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class RowStream:
+    """File-like CSV view of a row generator, read incrementally by COPY FROM STDIN."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._pending = ''
+
+    def read(self, size=-1):
+        lines = [self._pending]
+        length = len(self._pending)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = ','.join(csv_field(value) for value in row) + '\n'
+            lines.append(line)
+            length += len(line)
+        data = ''.join(lines)
+        if size < 0:
+            self._pending = ''
+            return data
+        data, self._pending = data[:size], data[size:]
+        return data
+
+
+def copy_rows(connection, model, columns, rows):
+    table = connection.ops.quote_name(model._meta.db_table)
+    column_list = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in columns)
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(f'COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)', RowStream(rows))
+        else:  # psycopg 3
+            with raw.copy(f'COPY {table} ({column_list}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+
+def insert_rows(connection, model, columns, rows, batch_size):
+    # Multi-row executemany rather than bulk_create, which would overwrite the
+    # generated created_at values with now() for auto_now_add fields.
+    fields = [model._meta.get_field(name) for name in columns]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column_list = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    sql = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['%s'] * len(fields))})"
+    with connection.cursor() as cursor:
+        batch = []
+        for row in rows:
+            batch.append([field.get_db_prep_save(value, connection) for field, value in zip(fields, row)])
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def write_chunk(plan, table, start, stop, batch_size):
+    """Generate and store rows [start, stop) of one table; returns (table, rows, started, finished)."""
+    started = time.time()
+    connection = connections[plan.using]
+    with transaction.atomic(using=plan.using):
+        if table == 'ratingsummaries':
+            first = plan.offsets['listings'] + start + 1
+            rebuild_rating_summaries(range(first, first + stop - start), using=plan.using)
+        else:
+            generator, columns = TABLES[table]
+            rows = generator(plan, start, stop)
+            if connection.vendor == 'postgresql':
+                copy_rows(connection, MODELS[table], columns, rows)
+            else:
+                insert_rows(connection, MODELS[table], columns, rows, batch_size)
+    return table, stop - start, started, time.time()
+
+
+def _write_chunk_in_worker(args):
+    try:
+        return write_chunk(*args)
+    finally:
+        connections.close_all()
+
+
+def seed(volumes=None, chunk_size=10000, batch_size=1000, workers=1, random_seed=0, using='default', report=None):
+    """
+    Append synthetic, referentially consistent rows to every table.
+
+    Rows come from generators in chunks of `chunk_size`, so memory stays flat
+    at any volume. PostgreSQL loads each chunk with COPY FROM STDIN, other
+    backends with batched multi-row INSERTs. With `workers` > 1 the chunks of a stage are
+    spread over worker processes (PostgreSQL only; SQLite has one writer).
+    Model signals do not fire: booking rows and rating summaries are
+    generated as tables of their own. Returns {table: (rows, seconds)}.
+    """
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    if connections[using].vendor != 'postgresql':
+        workers = 1
+    plan = Plan(volumes, random_seed=random_seed, using=using)
+
+    stats = {}
+    for stage in STAGES:
+        tasks = [
+            (plan, table, start, min(start + chunk_size, plan.counts[table]), batch_size)
+            for table in stage
+            for start in range(0, plan.counts[table], chunk_size)
+        ]
+        if workers > 1:
+            connections.close_all()  # Each forked worker opens its own connection
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                results = list(pool.map(_write_chunk_in_worker, tasks))
+        else:
+            results = [write_chunk(*task) for task in tasks]
+
+        for table in stage:
+            chunks = [result for result in results if result[0] == table]
+            rows = sum(result[1] for result in chunks)
+            seconds = max(result[3] for result in chunks) - min(result[2] for result in chunks) if chunks else 0.0
+            stats[table] = (rows, seconds)
+            if report:
+                report(table, rows, seconds)
+
+    # Explicit ids leave PostgreSQL sequences behind the data
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), list(MODELS.values()))
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    bump_version(CATALOG_NAMESPACE)
+    # New bookings change the free slots cached per provider
+    booked = (
+        ServiceRequest.objects.using(using).filter(pk__gt=plan.offsets['requests'])
+        .values_list('employee_id', flat=True).distinct()
+    )
+    for employee_id in booked:
+        bump_version(availability_namespace(employee_id))
+    return stats
+
+
+def seed_data(volumes=None, batch_size=1000, random_seed=0):
+    """Small single-process seed for the benchmark and budget commands; returns the volumes used."""
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    seed(volumes, batch_size=batch_size, random_seed=random_seed)
+    return volumes
@@ -1,8 +1,12 @@
 from rest_framework import serializers
-from .models import Register,OTP,Profile,Services, Subservices, ServiceRegistry,ServiceRequest,BookingList,Review,Payment
-from django.utils import timezone
-from datetime import timedelta
+from .models import Register,Profile,Services, Subservices, ServiceRegistry,ServiceRequest,BookingList,Review,Payment,RatingSummary
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
+from functools import cached_property
+from .listings import LISTING_SORTS
+from .otp import get_otp_backend
+from .tokens import RedisRefreshToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -29,37 +33,23 @@ class RegisterSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Password must be at least 8 characters long.")
         return value
     
-class OTPVerificationSerializer(serializers.Serializer):
-    email = serializers.EmailField()
-    otp_code = serializers.CharField(max_length=6)
+class RedisTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RedisRefreshToken
 
-    def validate(self, attrs):
-        email = attrs.get('email')
-        otp_code = attrs.get('otp_code')
 
-        try:
-            user = Register.objects.get(email=email)
-        except Register.DoesNotExist:
-            raise serializers.ValidationError("User with this email does not exist.")
+class RedisTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RedisRefreshToken
 
-        try:
-            otp_entry = OTP.objects.filter(user=user).order_by('-created_at').first()
-        except OTP.DoesNotExist:
-            raise serializers.ValidationError("No OTP found for this user.")
 
-        if otp_entry.otp_code != otp_code:
-            raise serializers.ValidationError("Invalid OTP code.")
-
-        if otp_entry.created_at < timezone.now() - timedelta(minutes=5):
-            raise serializers.ValidationError("OTP has expired.")
+class OTPVerificationSerializer(serializers.Serializer):
+    email = serializers.EmailField()
+    otp_code = serializers.CharField(max_length=6)
 
+    def validate(self, attrs):
+        # Checking and consuming the code is one step, so it cannot be replayed
+        if not get_otp_backend().verify(attrs['email'], attrs['otp_code']):
+            raise serializers.ValidationError("Invalid or expired OTP code.")
         return attrs
-
-    def save(self):
-        email = self.validated_data['email']
-        user = Register.objects.get(email=email)
-        OTP.objects.filter(user=user).delete()
-        return user
     
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -96,17 +86,86 @@ class ServicesSerializer(serializers.ModelSerializer):
 class ServiceRegistrySerializer(serializers.ModelSerializer):
     employee_name = serializers.CharField(source='employee.name', read_only=True)  
     service_title = serializers.CharField(source='service.title', read_only=True) 
+    review_count = serializers.IntegerField(source='rating_summary.review_count', read_only=True)
+    average_rating = serializers.FloatField(source='rating_summary.average_rating', read_only=True)
 
     class Meta:
         model = ServiceRegistry
-        fields = ['id', 'employee', 'employee_name', 'service', 'service_title', 'min_price', 'max_price', 'description']
+        fields = ['id', 'employee', 'employee_name', 'service', 'service_title', 'min_price', 'max_price', 'description', 'review_count', 'average_rating']
         
         
 
 class ServiceRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceRequest
-        fields = '__all__' 
+        exclude = ['employee']  # Internal copy of service_registry.employee
+
+    def validate(self, attrs):
+        from_time = attrs.get('from_time', getattr(self.instance, 'from_time', None))
+        to_time = attrs.get('to_time', getattr(self.instance, 'to_time', None))
+        if from_time and to_time and from_time >= to_time:
+            raise serializers.ValidationError("from_time must be before to_time.")
+        return attrs
+
+
+class SlotSerializer(serializers.Serializer):
+    service_registry = serializers.IntegerField()
+    from_time = serializers.DateTimeField()
+    to_time = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['from_time'] >= attrs['to_time']:
+            raise serializers.ValidationError("from_time must be before to_time.")
+        return attrs
+
+
+class SlotCheckSerializer(serializers.Serializer):
+    slots = SlotSerializer(many=True, allow_empty=False, max_length=200)
+
+
+class BulkServiceRequestItemSerializer(serializers.Serializer):
+    """One item of a bulk submission; the registry is resolved for the whole batch at once."""
+    service_registry = serializers.IntegerField()
+    title = serializers.CharField(max_length=100)
+    description = serializers.CharField()
+    from_time = serializers.DateTimeField()
+    to_time = serializers.DateTimeField()
+
+    def validate(self, attrs):
+        if attrs['from_time'] >= attrs['to_time']:
+            raise serializers.ValidationError("from_time must be before to_time.")
+        return attrs
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField(required=False)
+    slot = serializers.IntegerField(min_value=15, max_value=8 * 60, default=60)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', attrs['start'])
+        days = (attrs['end'] - attrs['start']).days + 1
+        if days < 1:
+            raise serializers.ValidationError("end must not be before start.")
+        if days > settings.AVAILABILITY_MAX_DAYS:
+            raise serializers.ValidationError(f"At most {settings.AVAILABILITY_MAX_DAYS} days can be requested at once.")
+        return attrs
+
+class ServiceRegistryQuerySerializer(serializers.Serializer):
+    service = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, max_length=50)
+    budget_min = serializers.IntegerField(min_value=0, required=False)
+    budget_max = serializers.IntegerField(min_value=0, required=False)
+    min_rating = serializers.FloatField(min_value=1, max_value=5, required=False)
+    sort = serializers.ChoiceField(choices=list(LISTING_SORTS), default='newest')
+
+    def validate(self, attrs):
+        if attrs.get('budget_min', 0) > attrs.get('budget_max', attrs.get('budget_min', 0)):
+            raise serializers.ValidationError("budget_min must not be above budget_max.")
+        return attrs
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
 
 class BookingListSerializer(serializers.ModelSerializer):
     register = RegisterSerializer()  
@@ -115,6 +174,19 @@ class BookingListSerializer(serializers.ModelSerializer):
     class Meta:
         model = BookingList
         fields = '__all__'
+
+
+
+class MyBookingSerializer(serializers.Serializer):
+    """Flat booking row built from a `.values()` query, no nested serializers."""
+    id = serializers.IntegerField()
+    booking_date = serializers.DateTimeField()
+    service_request = serializers.IntegerField(source='service_request_id')
+    title = serializers.CharField(source='service_request__title')
+    service_title = serializers.CharField(source='service_request__service_registry__service__title')
+    provider_name = serializers.CharField(source='service_request__service_registry__employee__name')
+    from_time = serializers.DateTimeField(source='service_request__from_time')
+    to_time = serializers.DateTimeField(source='service_request__to_time')
         
         
         
@@ -127,12 +199,31 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = ['id', 'service', 'service_registry', 'rating', 'comment', 'created_at']
         read_only_fields = ['id', 'user', 'created_at']
 
+    def validate_rating(self, value):
+        if not 1 <= value <= 5:
+            raise serializers.ValidationError("Rating must be between 1 and 5.")
+        return value
+
     def create(self, validated_data):
         request = self.context.get('request')
         validated_data['user'] = request.user  # Automatically assign user
         return super().create(validated_data)
 
 
+class ListingReviewSerializer(serializers.ModelSerializer):
+    user_name = serializers.CharField(source='user.name', read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ['id', 'user_name', 'rating', 'comment', 'created_at']
+
+
+class RatingSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RatingSummary
+        fields = ['review_count', 'average_rating', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5']
+
+
 
 
 
@@ -156,4 +247,86 @@ class PaymentSerializer(serializers.ModelSerializer):
 class VerifyPaymentSerializer(serializers.Serializer):
     order_id = serializers.CharField()
     payment_id = serializers.CharField()
-    signature = serializers.CharField()
\ No newline at end of file
+    signature = serializers.CharField()
+
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for a ModelSerializer on list endpoints.
+
+    The serializer's readable fields (nested serializers included) are
+    compiled once into `.values()` lookups plus a converter per field, and
+    rows are shaped straight from the dicts the database returns. The output
+    matches `serializer_class(queryset, many=True).data`.
+    """
+    identity_fields = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.FloatField,
+        serializers.IntegerField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def compiled(self):
+        lookups = {}
+        plan = self._compile(self.serializer_class(), '', lookups)
+        return plan, list(lookups)
+
+    @property
+    def lookups(self):
+        return self.compiled[1]
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def to_representation(self, rows):
+        plan = self.compiled[0]
+        return [self._build(plan, row) for row in rows]
+
+    def serialize(self, queryset):
+        return self.to_representation(self.values(queryset))
+
+    def _compile(self, serializer, prefix, lookups):
+        model = serializer.Meta.model
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.ListSerializer, serializers.SerializerMethodField)):
+                raise ValueError(f"{type(serializer).__name__}.{name} cannot be read from .values()")
+            lookup = prefix + '__'.join(field.source_attrs)
+            if isinstance(field, serializers.BaseSerializer):
+                related_pk = f"{lookup}__{field.Meta.model._meta.pk.name}"
+                lookups[related_pk] = None
+                plan.append((name, related_pk, self._compile(field, lookup + '__', lookups)))
+                continue
+            lookups[lookup] = None
+            plan.append((name, lookup, self._converter(model, field)))
+        return plan
+
+    def _converter(self, model, field):
+        if isinstance(field, serializers.FileField):
+            storage = model._meta.get_field(field.source_attrs[-1]).storage
+            return lambda name: storage.url(name) if name else None
+        if isinstance(field, self.identity_fields):
+            return None
+        return field.to_representation
+
+    def _build(self, plan, row):
+        data = {}
+        for name, lookup, convert in plan:
+            value = row[lookup]
+            if isinstance(convert, list):
+                data[name] = None if value is None else self._build(convert, row)
+            elif convert is None or value is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+
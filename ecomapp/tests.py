@@ -1,3 +1,1210 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import hmac
+import io
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+import razorpay
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .models import BookingList, EmailOutbox, EmployeeRegistration, Payment, PaymentEvent, RatingSummary, Register, Review, ServiceRegistry, ServiceRequest, Services, Subservices, OTP, RATING_STAR_FIELDS, RegisterQuerySet, rebuild_rating_summaries
+from .booking import compute_free_slots, find_conflicts
+from .authentication import CachedJWTAuthentication
+from .cache import CATALOG_NAMESPACE, _version_key, availability_namespace, get_version, user_cache
+from .email import drain_outbox, enqueue_otp_email
+from .otp import DatabaseOTPBackend
+from .tokens import blacklist_key
+from . import payments
+from .metrics import METHOD_LABELS, REQUEST_LATENCY
+from .payments import AsyncPaymentGateway, CircuitBreaker, GatewayUnavailable, PaymentGateway
+from .search import fts5_query, search
+from .seeding import seed_data
+from .webhooks import ORPHAN_MAX_ATTEMPTS, apply_payment_events
+from .serializers import BookingListSerializer, ReviewSerializer, ServiceRegistrySerializer, ServiceRequestSerializer, ValuesSerializer
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode('ascii')
+
+
+class CatalogMixin:
+    """A user, one service and a provider with two listings."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Register.objects.create_user('user@example.com', 'password123', name='User', phone_number='9000000001')
+        cls.service = Services.objects.create(title='AC repair', description='Cooling fixes', status='Active')
+        cls.employee = EmployeeRegistration.objects.create(name='Ravi', age=30, phone_number='9000000002')
+        cls.listing = ServiceRegistry.objects.create(employee=cls.employee, service=cls.service, min_price=100, max_price=500, description='Split units')
+        cls.other_listing = ServiceRegistry.objects.create(employee=cls.employee, service=cls.service, min_price=200, max_price=900, description='Window units')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class ServiceCatalogCacheTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def titles(self):
+        return [service['title'] for service in self.client.get('/services/').data]
+
+    def test_second_request_is_served_from_cache(self):
+        self.assertEqual(self.titles(), ['AC repair'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['AC repair'])
+
+    def test_edit_invalidates_after_commit(self):
+        self.titles()
+        version = get_version(CATALOG_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Services.objects.create(title='Plumbing', description='Pipes', status='Active')
+            self.assertEqual(get_version(CATALOG_NAMESPACE), version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_version(CATALOG_NAMESPACE), version)
+        self.assertEqual(self.titles(), ['AC repair', 'Plumbing'])
+
+    def test_lost_version_key_does_not_revive_old_entries(self):
+        self.titles()
+        version = get_version(CATALOG_NAMESPACE)
+        Services.objects.filter(pk=self.service.pk).update(title='Heating')  # No signal
+        cache.delete(_version_key(CATALOG_NAMESPACE))
+        self.assertNotEqual(get_version(CATALOG_NAMESPACE), version)
+        self.assertEqual(self.titles(), ['Heating'])
+
+
+class UserCacheTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user_cache.delete(self.user.pk)
+        self.auth = CachedJWTAuthentication()
+        self.token = self.auth.get_validated_token(str(AccessToken.for_user(self.user)))
+
+    def test_second_lookup_is_served_from_cache(self):
+        self.assertEqual(self.auth.get_user(self.token), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.auth.get_user(self.token), self.user)
+
+    def test_save_invalidates_after_commit(self):
+        self.auth.get_user(self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = Register.objects.get(pk=self.user.pk)
+            user.name = 'Renamed'
+            user.save()
+            self.assertIsNotNone(user_cache.get(self.user.pk))
+        self.assertIsNone(user_cache.get(self.user.pk))
+        self.assertEqual(self.auth.get_user(self.token).name, 'Renamed')
+
+    def test_queryset_update_invalidates_after_commit(self):
+        self.auth.get_user(self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Register.objects.filter(is_active=True).update(is_active=False), 1)
+            self.assertIsNotNone(user_cache.get(self.user.pk))
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_queryset_update_runs_in_batches(self):
+        users = [self.user] + [
+            Register.objects.create_user(f'user{index}@example.com', 'password123', name='User', phone_number='9000000001')
+            for index in range(4)
+        ]
+        for user in users:
+            user_cache.set(user.pk, user)
+        with mock.patch.object(RegisterQuerySet, 'update_batch_size', 2), self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(Register.objects.filter(is_active=True).update(is_active=False), 5)
+        self.assertEqual(len(callbacks), 3)
+        self.assertFalse(Register.objects.filter(is_active=True).exists())
+        self.assertEqual([user_cache.get(user.pk) for user in users], [None] * 5)
+
+    def test_password_change_invalidates(self):
+        self.auth.get_user(self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            user = Register.objects.get(pk=self.user.pk)
+            user.set_password('new-password')
+            user.save()
+        self.assertTrue(self.auth.get_user(self.token).check_password('new-password'))
+
+
+class TokenBlacklistTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def obtain(self):
+        response = self.client.post('/token/', {'email': self.user.email, 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['refresh']
+
+    def refresh(self, token):
+        return self.client.post('/token/refresh/', {'refresh': token}, format='json')
+
+    def test_obtain_writes_no_outstanding_token(self):
+        self.obtain()
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_rotated_refresh_token_is_rejected(self):
+        token = self.obtain()
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_logged_out_token_is_rejected(self):
+        token = self.obtain()
+        self.assertEqual(self.client.post('/logout/', {'refresh': token}, format='json').status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_migrate_copies_live_blacklisted_tokens(self):
+        live, expired, outstanding = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        live.blacklist()
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        output = io.StringIO()
+        call_command('migrate_token_blacklist', '--prune', '--batch-size', '1', stdout=output)
+        self.assertIn('Copied 1 blacklisted tokens to the cache.', output.getvalue())
+        self.assertIn('Pruned 2 outstanding tokens.', output.getvalue())
+        self.assertIsNotNone(cache.get(blacklist_key(live['jti'])))
+        self.assertIsNone(cache.get(blacklist_key(expired['jti'])))
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [outstanding['jti']])
+        self.assertEqual(self.refresh(str(live)).status_code, 401)
+        self.assertEqual(self.refresh(str(outstanding)).status_code, 200)
+
+
+class MetricsTests(CatalogMixin, TestCase):
+    def test_unknown_methods_share_one_series(self):
+        for method in ('X0', 'X1', 'X2', 'get', 'GET'):
+            self.client.generic(method, '/services/')
+        methods = {method for endpoint, method in REQUEST_LATENCY._series if endpoint == 'services'}
+        self.assertIn('other', methods)
+        self.assertLessEqual(methods, METHOD_LABELS | {'other'})
+
+
+class KeysetPaginationTests(CatalogMixin, TestCase):
+    endpoints = {
+        '/bookings/': ['2025-01-01T00:00:00+00:00', 1],
+        '/reviews/': ['2025-01-01T00:00:00+00:00', 1],
+        '/service-registry/': [1],
+        '/service-registry/?sort=rating': [4.5, 1],
+    }
+
+    def test_valid_cursor(self):
+        for url, position in self.endpoints.items():
+            separator = '&' if '?' in url else '?'
+            response = self.client.get(f'{url}{separator}cursor={encode_cursor(position)}')
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_tampered_cursor_is_not_found(self):
+        for url, position in self.endpoints.items():
+            separator = '&' if '?' in url else '?'
+            for tampered in (['abc'] + position[1:], position[:-1] + ['x'], [None] * len(position), [{'a': 1}] + position[1:], position + [1], 'bm90IGpzb24'):
+                cursor = tampered if isinstance(tampered, str) else encode_cursor(tampered)
+                response = self.client.get(f'{url}{separator}cursor={cursor}')
+                self.assertEqual(response.status_code, 404, f'{url} {tampered!r}')
+
+    def test_pages_follow_the_ordering(self):
+        response = self.client.get('/service-registry/?page_size=1')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.other_listing.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], [self.listing.pk])
+        self.assertIsNone(response.data['next'])
+
+
+class ListingSearchTests(CatalogMixin, TestCase):
+    """listing 100-500 rated 5, other_listing 200-900 rated 3, plumbing 1000-2000 and cheap 50-60 unrated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.plumbing_service = Services.objects.create(title='Plumbing', description='Pipes', status='Active')
+        cls.plumbing = ServiceRegistry.objects.create(employee=cls.employee, service=cls.plumbing_service, min_price=1000, max_price=2000, description='Leaks')
+        cls.cheap = ServiceRegistry.objects.create(employee=cls.employee, service=cls.plumbing_service, min_price=50, max_price=60, description='Taps')
+        Review.objects.create(user=cls.user, service=cls.listing, rating=5, comment='Great')
+        Review.objects.create(user=cls.user, service=cls.other_listing, rating=3, comment='Fine')
+
+    def ids(self, query, page_size=1):
+        """Every listing id of the search, following the next links one small page at a time."""
+        response = self.client.get(f'/service-registry/?page_size={page_size}&{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        ids = [row['id'] for row in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids += [row['id'] for row in response.data['results']]
+        return ids
+
+    def test_service(self):
+        self.assertEqual(self.ids(f'service={self.plumbing_service.pk}'), [self.cheap.pk, self.plumbing.pk])
+        self.assertEqual(len(self.ids(f'service={self.service.pk}&service={self.plumbing_service.pk}')), 4)
+
+    def test_budget_overlaps_the_price_range(self):
+        self.assertEqual(self.ids('budget_min=600&budget_max=1000'), [self.plumbing.pk, self.other_listing.pk])
+        self.assertEqual(self.ids('budget_min=950'), [self.plumbing.pk])
+        self.assertEqual(self.ids('budget_max=99'), [self.cheap.pk])
+        self.assertEqual(self.client.get('/service-registry/?budget_min=10&budget_max=5').status_code, 400)
+
+    def test_min_rating(self):
+        self.assertEqual(self.ids('min_rating=4'), [self.listing.pk])
+        self.assertEqual(self.ids('min_rating=3&sort=rating'), [self.listing.pk, self.other_listing.pk])
+
+    def test_sorts(self):
+        everything = [self.cheap.pk, self.plumbing.pk, self.other_listing.pk, self.listing.pk]
+        self.assertEqual(self.ids('sort=newest'), everything)
+        self.assertEqual(self.ids('sort=price'), [self.cheap.pk, self.listing.pk, self.other_listing.pk, self.plumbing.pk])
+        self.assertEqual(self.ids('sort=-price'), [self.plumbing.pk, self.other_listing.pk, self.listing.pk, self.cheap.pk])
+
+    def test_rating_sort_keeps_unrated_listings_last(self):
+        expected = [self.listing.pk, self.other_listing.pk, self.cheap.pk, self.plumbing.pk]
+        self.assertEqual(self.ids('sort=rating'), expected)
+        self.assertEqual(self.ids('sort=rating', page_size=3), expected)
+        self.assertEqual(self.ids(f'sort=rating&service={self.plumbing_service.pk}'), [self.cheap.pk, self.plumbing.pk])
+
+
+class SearchTests(CatalogMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.subservice = Subservices.objects.create(services=cls.service, title='Cooling coil cleaning', description='Coil wash')
+        cls.cooling_listing = ServiceRegistry.objects.create(employee=cls.employee, service=cls.service, min_price=300, max_price=400, description='Cooling checks for split and window units')
+
+    def hits(self, text):
+        return [(hit['type'], hit['id']) for hit in search(text)]
+
+    def test_ranks_all_three_kinds(self):
+        results = search('cooling')
+        self.assertEqual(
+            {(hit['type'], hit['id']) for hit in results},
+            {('service', self.service.pk), ('subservice', self.subservice.pk), ('listing', self.cooling_listing.pk)},
+        )
+        # A title match outranks the description matches
+        self.assertEqual((results[0]['type'], results[0]['id']), ('subservice', self.subservice.pk))
+        self.assertEqual([hit['rank'] for hit in results], sorted((hit['rank'] for hit in results), reverse=True))
+        listing = next(hit for hit in results if hit['type'] == 'listing')
+        self.assertEqual((listing['title'], listing['service']), ('AC repair by Ravi', self.service.pk))
+        self.assertEqual(self.hits('split units'), [('listing', self.listing.pk), ('listing', self.cooling_listing.pk)])
+
+    def test_triggers_follow_insert_update_and_delete(self):
+        service = Services.objects.create(title='Plumbing', description='Pipes and taps', status='Active')
+        listing = ServiceRegistry.objects.create(employee=self.employee, service=service, min_price=10, max_price=20, description='Leaking taps')
+        self.assertEqual(self.hits('taps'), [('listing', listing.pk), ('service', service.pk)])
+
+        Services.objects.filter(pk=service.pk).update(description='Drains')
+        ServiceRegistry.objects.filter(pk=listing.pk).update(service=self.service, description='Blocked drains')
+        self.assertEqual(self.hits('taps'), [])
+        self.assertEqual({hit['service'] for hit in search('drains')}, {self.service.pk, service.pk})
+
+        ServiceRegistry.objects.filter(pk=listing.pk).delete()
+        service.delete()
+        self.assertEqual(self.hits('drains'), [])
+        self.assertEqual(self.hits('plumbing'), [])
+
+    def test_fts_syntax_in_the_query_is_plain_text(self):
+        self.assertEqual(fts5_query('cool* NEAR("coil") AND -wash'), '"cool" "NEAR" "coil" "AND" "wash"')
+        for text in ['"', '*', 'cooling*', 'cooling NEAR coil', 'NEAR(cooling coil)', 'title:cooling', 'cooling AND', '(', '^coil', "'", '-', 'OR NOT']:
+            response = self.client.get('/search/', {'q': text})
+            self.assertEqual(response.status_code, 200, text)
+            self.assertIsInstance(response.data['results'], list)
+        self.assertEqual(self.client.get('/search/', {'q': '"'}).data['results'], [])
+        self.assertEqual(self.client.get('/search/', {'q': 'title:coil'}).data['results'], [])
+        self.assertEqual([hit['id'] for hit in self.client.get('/search/', {'q': 'coil*'}).data['results']], [self.subservice.pk])
+
+
+class ValuesSerializerTests(TestCase):
+    cases = [
+        (ServiceRegistrySerializer, lambda: ServiceRegistry.objects.select_related('employee', 'service', 'rating_summary')),
+        (ServiceRequestSerializer, lambda: ServiceRequest.objects.all()),
+        (BookingListSerializer, lambda: BookingList.objects.select_related('register', 'service_request')),
+        (ReviewSerializer, lambda: Review.objects.select_related('service__employee', 'service__service', 'service__rating_summary')),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_data({'services': 3, 'subservices': 6, 'providers': 5, 'listings': 10, 'users': 5, 'requests': 30, 'reviews': 20, 'payments': 5})
+        # Null relations: a booking without user or request, a listing without a rating summary
+        BookingList.objects.create(booking_date=timezone.now())
+        listing = ServiceRegistry.objects.order_by('pk').first()
+        cls.unrated = ServiceRegistry.objects.create(employee=listing.employee, service=listing.service, min_price=1, max_price=2, description='New')
+
+    def test_matches_model_serializer(self):
+        self.assertFalse(RatingSummary.objects.filter(listing=self.unrated).exists())
+        self.assertTrue(BookingList.objects.filter(register__isnull=True, service_request__isnull=True).exists())
+        for serializer_class, queryset in self.cases:
+            with self.subTest(serializer_class.__name__):
+                expected = serializer_class(queryset().order_by('pk'), many=True).data
+                values = ValuesSerializer(serializer_class)
+                actual = values.to_representation(values.values(queryset()).order_by('pk'))
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(actual, expected)
+
+
+class RatingSummarySignalTests(CatalogMixin, TestCase):
+    fields = ['review_count', 'rating_total', 'average_rating', *RATING_STAR_FIELDS]
+
+    def summaries(self):
+        return {row['listing']: row for row in RatingSummary.objects.values('listing', *self.fields)}
+
+    def assertMatchesRebuild(self):
+        incremental = self.summaries()
+        rebuild_rating_summaries([self.listing.pk, self.other_listing.pk])
+        rebuilt = self.summaries()
+        # A listing never reviewed has no summary row until a rebuild writes an empty one
+        for listing_id, row in rebuilt.items():
+            if listing_id in incremental:
+                self.assertEqual(incremental[listing_id], row)
+            else:
+                self.assertEqual(row['review_count'], 0)
+
+    def review(self, rating, listing=None):
+        return Review.objects.create(user=self.user, service=listing or self.listing, rating=rating, comment='Fine')
+
+    def test_first_review_creates_the_summary(self):
+        self.assertFalse(RatingSummary.objects.exists())
+        self.review(4)
+        summary = RatingSummary.objects.get(listing=self.listing)
+        self.assertEqual((summary.review_count, summary.average_rating, summary.stars_4), (1, 4.0, 1))
+        self.assertMatchesRebuild()
+
+    def test_create(self):
+        self.review(5)
+        self.review(2)
+        self.assertEqual(RatingSummary.objects.get(listing=self.listing).average_rating, 3.5)
+        self.assertMatchesRebuild()
+
+    def test_rating_change(self):
+        review = self.review(5)
+        self.review(3)
+        review.rating = 1
+        review.save()
+        self.assertEqual(RatingSummary.objects.get(listing=self.listing).average_rating, 2.0)
+        self.assertMatchesRebuild()
+
+    def test_move_to_another_listing(self):
+        review = self.review(5)
+        self.review(3)
+        review.service = self.other_listing
+        review.save()
+        self.assertEqual(RatingSummary.objects.get(listing=self.listing).review_count, 1)
+        self.assertEqual(RatingSummary.objects.get(listing=self.other_listing).average_rating, 5.0)
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        review = self.review(5)
+        self.review(3)
+        review.delete()
+        self.assertEqual(RatingSummary.objects.get(listing=self.listing).average_rating, 3.0)
+        self.review(4).delete()
+        self.assertMatchesRebuild()
+
+    def test_deleting_the_last_review_clears_the_average(self):
+        self.review(5).delete()
+        summary = RatingSummary.objects.get(listing=self.listing)
+        self.assertEqual((summary.review_count, summary.average_rating), (0, None))
+        self.assertMatchesRebuild()
+
+
+class SeedingTests(TestCase):
+    volumes = {'services': 2, 'subservices': 4, 'providers': 4, 'listings': 6, 'users': 4, 'requests': 12, 'reviews': 15, 'payments': 3}
+
+    def test_seeding_a_live_database(self):
+        seed_data(self.volumes)
+        # Provider ids the next run will use, read as a cache would before they exist
+        offset = EmployeeRegistration.objects.count()
+        upcoming = range(offset + 1, offset + self.volumes['providers'] + 1)
+        before = {employee_id: get_version(availability_namespace(employee_id)) for employee_id in upcoming}
+
+        seed_data(self.volumes, random_seed=1)
+        booked = set(ServiceRequest.objects.order_by('-pk')[:self.volumes['requests']].values_list('employee_id', flat=True))
+        self.assertTrue(booked)
+        for employee_id in booked:
+            self.assertGreater(get_version(availability_namespace(employee_id)), before[employee_id])
+
+        summaries = {summary.listing_id: summary for summary in RatingSummary.objects.all()}
+        self.assertEqual(len(summaries), ServiceRegistry.objects.count())
+        for listing in ServiceRegistry.objects.all():
+            ratings = list(Review.objects.filter(service=listing).values_list('rating', flat=True))
+            self.assertEqual(summaries[listing.pk].review_count, len(ratings))
+            self.assertEqual(summaries[listing.pk].rating_total, sum(ratings))
+
+
+def at(hour, minute=0, day=1):
+    return datetime(2030, 1, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class BookingOverlapTests(CatalogMixin, TestCase):
+    def book(self, listing, from_time, to_time):
+        return self.client.post('/service-requests/', {
+            'service_registry': listing.pk, 'title': 'Fix AC', 'description': 'Not cooling',
+            'from_time': from_time.isoformat(), 'to_time': to_time.isoformat(),
+        }, format='json')
+
+    def test_windows_are_half_open(self):
+        self.assertEqual(self.book(self.listing, at(10), at(11)).status_code, 201)
+        # Touching windows share no instant
+        self.assertEqual(self.book(self.listing, at(11), at(12)).status_code, 201)
+        self.assertEqual(self.book(self.listing, at(9), at(10)).status_code, 201)
+        self.assertEqual(self.book(self.listing, at(10, 59), at(11, 1)).status_code, 409)
+        self.assertEqual(self.book(self.listing, at(8), at(13)).status_code, 409)
+        self.assertEqual(ServiceRequest.objects.count(), 3)
+
+    def test_conflicts_span_the_providers_listings(self):
+        self.assertEqual(self.book(self.listing, at(10), at(11)).status_code, 201)
+        response = self.book(self.other_listing, at(10, 30), at(11, 30))
+        self.assertEqual(response.status_code, 409)
+
+    def test_update_excludes_itself(self):
+        pk = self.book(self.listing, at(10), at(11)).data['id']
+        self.assertEqual(self.book(self.listing, at(12), at(13)).status_code, 201)
+        response = self.client.patch(f'/service-requests/{pk}/', {'to_time': at(11, 30).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('employee', response.data)
+        response = self.client.patch(f'/service-requests/{pk}/', {'to_time': at(12, 30).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(ServiceRequest.objects.get(pk=pk).to_time, at(11, 30))
+
+    def test_find_conflicts(self):
+        booked = self.book(self.listing, at(10), at(11)).data['id']
+        employee_id = self.employee.pk
+        conflicts = find_conflicts([
+            (employee_id, at(9), at(10)),
+            (employee_id, at(11), at(12)),
+            (employee_id, at(10, 30), at(10, 45)),
+            (employee_id + 1, at(10), at(11)),
+        ])
+        self.assertEqual(conflicts, [[], [], [booked], []])
+        self.assertEqual(find_conflicts([(employee_id, at(10), at(11))], exclude_pk=booked), [[]])
+
+    def test_save_copies_the_provider_only_when_needed(self):
+        request = ServiceRequest.objects.create(service_registry=self.listing, title='t', description='d', from_time=at(10), to_time=at(11))
+        self.assertEqual(request.employee_id, self.employee.pk)
+        request = ServiceRequest.objects.get(pk=request.pk)
+        request.title = 'Renamed'
+        with self.assertNumQueries(1):
+            request.save()
+        other_employee = EmployeeRegistration.objects.create(name='Meera', age=28, phone_number='9000000003')
+        moved = ServiceRegistry.objects.create(employee=other_employee, service=self.service, min_price=1, max_price=2, description='Other')
+        request.service_registry_id = moved.pk
+        request.save()
+        self.assertEqual(request.employee_id, other_employee.pk)
+
+
+class BookingListTests(CatalogMixin, TestCase):
+    def test_updates_add_no_booking(self):
+        response = self.client.post('/service-requests/', {
+            'service_registry': self.listing.pk, 'title': 'Fix AC', 'description': 'Not cooling',
+            'from_time': at(10).isoformat(), 'to_time': at(11).isoformat(),
+        }, format='json')
+        pk = response.data['id']
+        booking = BookingList.objects.get(service_request=pk)
+        self.assertEqual(booking.register, self.user)
+
+        response = self.client.put(f'/service-requests/{pk}/', {
+            'service_registry': self.other_listing.pk, 'title': 'Fix AC', 'description': 'Still not cooling',
+            'from_time': at(12).isoformat(), 'to_time': at(13).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(f'/service-requests/{pk}/', {'title': 'Fix split AC'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(BookingList.objects.values_list('pk', flat=True)), [booking.pk])
+
+
+class DedupeBookingsTests(TransactionTestCase):
+    """Runs without the unique constraint, as on a table that predates it."""
+
+    def setUp(self):
+        self.constraint = next(c for c in BookingList._meta.constraints if c.name == 'bookinglist_unique_request')
+        # SQLite rebuilds the table from the model's constraints, so drop it there too
+        others = [c for c in BookingList._meta.constraints if c is not self.constraint]
+        with mock.patch.object(BookingList._meta, 'constraints', others), connection.schema_editor() as editor:
+            editor.remove_constraint(BookingList, self.constraint)
+        self.addCleanup(self.restore_constraint)
+
+        employee = EmployeeRegistration.objects.create(name='Ravi', age=30, phone_number='9000000002')
+        service = Services.objects.create(title='AC repair', description='Cooling fixes', status='Active')
+        listing = ServiceRegistry.objects.create(employee=employee, service=service, min_price=100, max_price=500, description='Split units')
+        self.requests = [
+            ServiceRequest.objects.create(service_registry=listing, title='t', description='d', from_time=at(hour), to_time=at(hour + 1))
+            for hour in (9, 10, 11)
+        ]
+        # Each request already has the booking its post_save wrote; add copies
+        self.kept = list(BookingList.objects.order_by('pk').values_list('pk', flat=True))
+        for request, copies in zip(self.requests, (2, 1, 0)):
+            for _ in range(copies):
+                BookingList.objects.create(booking_date=request.created_at, service_request=request)
+
+    def restore_constraint(self):
+        BookingList.objects.all().delete()
+        with connection.schema_editor() as editor:
+            editor.add_constraint(BookingList, self.constraint)
+
+    def dedupe(self, *args):
+        output = io.StringIO()
+        call_command('dedupe_bookings', '--batch-size', '1', *args, stdout=output)
+        return output.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        self.assertIn('Would delete 3 duplicate booking rows.', self.dedupe('--dry-run'))
+        self.assertEqual(BookingList.objects.count(), 6)
+
+    def test_keeps_the_oldest_booking_of_each_request(self):
+        self.assertIn('Deleted 3 duplicate booking rows.', self.dedupe())
+        self.assertEqual(sorted(BookingList.objects.values_list('pk', flat=True)), self.kept)
+        self.assertIn('Deleted 0 duplicate booking rows.', self.dedupe())
+
+
+class BulkServiceRequestTests(CatalogMixin, TestCase):
+    def item(self, start, end, listing=None, **fields):
+        listing = listing or self.listing
+        return {'service_registry': getattr(listing, 'pk', listing), 'title': 't', 'description': 'd',
+                'from_time': at(start).isoformat(), 'to_time': at(end).isoformat(), **fields}
+
+    def post(self, items):
+        return self.client.post('/service-requests/bulk/', items, format='json')
+
+    def test_valid_items_are_created_and_invalid_ones_reported(self):
+        ServiceRequest.objects.create(service_registry=self.listing, title='t', description='d', from_time=at(9), to_time=at(10))
+        response = self.post([
+            self.item(10, 11),
+            self.item(12, 11),            # Ends before it starts
+            self.item(9, 10, title=''),   # Field error
+            self.item(9, 10),             # Overlaps the existing booking
+            self.item(13, 14, listing=self.other_listing),
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertIn('title', response.data['errors'][1]['errors'])
+        self.assertEqual(ServiceRequest.objects.count(), 3)
+
+    def test_overlaps_within_the_batch_are_rejected(self):
+        # Both listings belong to the same provider
+        response = self.post([self.item(10, 12), self.item(11, 13, listing=self.other_listing), self.item(12, 13)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(ServiceRequest.objects.count(), 2)
+
+    def test_unknown_service_registry(self):
+        response = self.post([self.item(10, 11, listing=999999)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{'index': 0, 'errors': {'service_registry': ['ServiceRegistry not found.']}}])
+        self.assertFalse(ServiceRequest.objects.exists())
+
+    def test_one_booking_per_created_request(self):
+        response = self.post([self.item(hour, hour + 1) for hour in range(9, 14)])
+        created = [row['id'] for row in response.data['created']]
+        self.assertEqual(len(created), 5)
+        self.assertEqual(sorted(BookingList.objects.values_list('service_request', flat=True)), sorted(created))
+        self.assertFalse(BookingList.objects.exclude(register=self.user).exists())
+
+    def test_item_cap(self):
+        items = [self.item(10, 11)] * 101
+        response = self.post(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ServiceRequest.objects.exists())
+        self.assertEqual(self.post(items[:100]).status_code, 201)
+
+
+@override_settings(TIME_ZONE='UTC', AVAILABILITY_DAY_START_HOUR=9, AVAILABILITY_DAY_END_HOUR=18)
+class FreeSlotTests(CatalogMixin, TestCase):
+    days = [at(0, day=day).date() for day in (1, 2, 3)]
+
+    def book(self, from_time, to_time):
+        ServiceRequest.objects.create(service_registry=self.listing, title='t', description='d', from_time=from_time, to_time=to_time)
+
+    def starts(self, slot_minutes=60):
+        free = compute_free_slots(self.employee.pk, self.days, slot_minutes)
+        return {day.day: [start.strftime('%H:%M') for start, end in slots] for day, slots in free.items()}
+
+    def hours(self, first, last):
+        return [f'{hour:02d}:00' for hour in range(first, last)]
+
+    def test_empty_days(self):
+        self.assertEqual(self.starts(), {day: self.hours(9, 18) for day in (1, 2, 3)})
+
+    def test_partly_booked_slot(self):
+        self.book(at(10, 30), at(11, 15))
+        # 10:00 and 11:00 are both partly taken; later slots stay on the grid
+        self.assertEqual(self.starts()[1], ['09:00'] + self.hours(12, 18))
+        self.assertEqual(self.starts(30)[1][:4], ['09:00', '09:30', '10:00', '11:30'])
+
+    def test_booking_across_midnight(self):
+        self.book(at(17, 30, day=1), at(9, 45, day=2))
+        starts = self.starts()
+        self.assertEqual(starts[1], self.hours(9, 17))
+        self.assertEqual(starts[2], self.hours(10, 18))
+        self.assertEqual(starts[3], self.hours(9, 18))
+
+    def test_booking_spanning_several_days(self):
+        self.book(at(12, day=1), at(11, day=3))
+        self.book(at(14, day=3), at(15, day=3))
+        starts = self.starts()
+        self.assertEqual(starts[1], self.hours(9, 12))
+        self.assertEqual(starts[2], [])
+        self.assertEqual(starts[3], ['11:00', '12:00', '13:00'] + self.hours(15, 18))
+
+    def assertBumpedAfterCommit(self, book):
+        namespace = availability_namespace(self.employee.pk)
+        version = get_version(namespace)
+        with self.captureOnCommitCallbacks(execute=True):
+            book()
+            self.assertEqual(get_version(namespace), version)
+        self.assertGreater(get_version(namespace), version)
+
+    def test_version_moves_after_commit(self):
+        self.assertBumpedAfterCommit(lambda: self.book(at(10), at(11)))
+
+    def test_bulk_version_moves_after_commit(self):
+        item = {'service_registry': self.listing.pk, 'title': 't', 'description': 'd', 'from_time': at(12).isoformat(), 'to_time': at(13).isoformat()}
+
+        def book():
+            response = self.client.post('/service-requests/bulk/', [item], format='json')
+            self.assertEqual(response.status_code, 201)
+        self.assertBumpedAfterCommit(book)
+
+
+class FailingBackend(locmem.EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException('Mail server unavailable')
+
+
+class OutboxTests(CatalogMixin, TestCase):
+    def test_login_queues_the_otp(self):
+        response = self.client.post('/login/', {'email': self.user.email, 'password': 'password123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(EmailOutbox.objects.filter(recipient=self.user.email, status='pending').count(), 1)
+
+        call_command('send_outbox', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        message = EmailOutbox.objects.get()
+        self.assertEqual((message.status, message.body), ('sent', ''))
+
+    def test_retry_with_backoff_then_success(self):
+        message = enqueue_otp_email(self.user.email, '123456')
+        stats = drain_outbox(backoff_seconds=30, connection=FailingBackend())
+        self.assertEqual((stats['sent'], stats['retried'], stats['failed']), (0, 1, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertIn('Mail server unavailable', message.last_error)
+        self.assertAlmostEqual((message.next_attempt_at - timezone.now()).total_seconds(), 30, delta=5)
+
+        # Not due yet, nothing is sent
+        self.assertEqual(drain_outbox()['sent'], 0)
+        self.assertEqual(mail.outbox, [])
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        stats = drain_outbox(backoff_seconds=30, connection=FailingBackend())
+        message.refresh_from_db()
+        # The delay doubles with every attempt
+        self.assertAlmostEqual((message.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5)
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        stats = drain_outbox()
+        self.assertEqual(stats['sent'], 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('sent', 3))
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('123456', mail.outbox[0].body)
+
+    def test_gives_up_after_max_attempts(self):
+        message = enqueue_otp_email(self.user.email, '123456')
+        for _ in range(2):
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            stats = drain_outbox(max_attempts=2, connection=FailingBackend())
+        self.assertEqual(stats['failed'], 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', 2))
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox()['sent'], 0)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(message.body, '')
+
+    @override_settings(OTP_TTL_SECONDS=45)
+    def test_otp_is_not_retried_past_its_ttl(self):
+        message = enqueue_otp_email(self.user.email, '123456')
+        self.assertEqual(drain_outbox(backoff_seconds=30, connection=FailingBackend())['retried'], 1)
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        # The next retry would land after the code expired
+        self.assertEqual(drain_outbox(backoff_seconds=30, connection=FailingBackend())['failed'], 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.body), ('failed', ''))
+
+    def test_expired_message_is_never_sent(self):
+        message = enqueue_otp_email(self.user.email, '123456')
+        EmailOutbox.objects.update(expires_at=timezone.now())
+        self.assertEqual(drain_outbox()['failed'], 1)
+        self.assertEqual(mail.outbox, [])
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.body), ('failed', ''))
+
+    def test_sends_outside_the_claim_transaction(self):
+        message = enqueue_otp_email(self.user.email, '123456')
+        depth = len(connection.atomic_blocks)  # The transactions TestCase wraps the test in
+        seen = []
+
+        class RecordingBackend(locmem.EmailBackend):
+            def send_messages(backend, messages):
+                seen.append((len(connection.atomic_blocks), EmailOutbox.objects.get(pk=message.pk).status))
+                return super().send_messages(messages)
+
+        self.assertEqual(drain_outbox(connection=RecordingBackend())['sent'], 1)
+        self.assertEqual(seen, [(depth, 'sending')])
+
+    def test_purge_keeps_pending_and_recent_messages(self):
+        old = timezone.now() - timedelta(days=2)
+        for status in ('pending', 'sent', 'failed'):
+            EmailOutbox.objects.create(subject='s', body='b', recipient=self.user.email, status=status)
+        EmailOutbox.objects.update(created_at=old)
+        recent = EmailOutbox.objects.create(subject='s', body='b', recipient=self.user.email, status='sent')
+        output = io.StringIO()
+        call_command('purge_outbox', '--hours', '24', '--batch-size', '1', stdout=output)
+        self.assertIn('Purged 2 finished outbox messages.', output.getvalue())
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list('status', flat=True)), ['pending', 'sent']
+        )
+        self.assertTrue(EmailOutbox.objects.filter(pk=recent.pk).exists())
+
+
+class DatabaseOTPBackendTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = DatabaseOTPBackend()
+
+    def store(self, otp_code, age=0):
+        self.backend.store(self.user, otp_code)
+        if age:
+            OTP.objects.filter(otp_code=otp_code).update(created_at=timezone.now() - timedelta(seconds=age))
+
+    def test_latest_code_is_valid_once(self):
+        self.store('111111', age=60)
+        self.store('222222')
+        self.assertTrue(self.backend.verify(self.user.email, '222222'))
+        self.assertFalse(OTP.objects.exists())
+        self.assertFalse(self.backend.verify(self.user.email, '222222'))
+
+    def test_older_code_is_rejected(self):
+        self.store('111111', age=60)
+        self.store('222222')
+        self.assertFalse(self.backend.verify(self.user.email, '111111'))
+        self.assertEqual(OTP.objects.count(), 2)
+
+    @override_settings(OTP_TTL_SECONDS=300)
+    def test_expired_code_is_rejected(self):
+        self.store('111111', age=301)
+        self.assertFalse(self.backend.verify(self.user.email, '111111'))
+
+    def test_other_users_codes_are_untouched(self):
+        other = Register.objects.create_user('other@example.com', 'password123', name='Other', phone_number='9000000009')
+        self.backend.store(other, '222222')
+        self.assertFalse(self.backend.verify(self.user.email, '222222'))
+        self.assertFalse(self.backend.verify('missing@example.com', '222222'))
+        self.assertTrue(self.backend.verify(other.email, '222222'))
+
+    @override_settings(OTP_TTL_SECONDS=300)
+    def test_purge_removes_only_expired_codes(self):
+        self.store('111111', age=301)
+        self.store('222222', age=299)
+        self.store('333333')
+        output = io.StringIO()
+        call_command('purge_expired_otps', '--batch-size', '1', stdout=output)
+        self.assertIn('Purged 1 expired OTP rows.', output.getvalue())
+        self.assertEqual(sorted(OTP.objects.values_list('otp_code', flat=True)), ['222222', '333333'])
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    """Answers with the next (status, body, delay) queued on the server, or a created order."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.respond()
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self):
+        self.server.calls += 1
+        status, body, delay = self.server.responses.pop(0) if self.server.responses else (200, {'id': 'order_1', 'status': 'created'}, 0)
+        time.sleep(delay)
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass  # The client timed out and hung up
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PaymentGatewayTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGatewayHandler)
+        self.server.daemon_threads = True
+        self.server.responses = []
+        self.server.calls = 0
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+        self.gateway = PaymentGateway(
+            'key', 'secret', timeout=(1, 0.3), breaker=self.breaker,
+            base_url=f'http://127.0.0.1:{self.server.server_address[1]}/v1',
+        )
+
+    def create(self):
+        return self.gateway.create_order({'amount': 50000, 'currency': 'INR'})
+
+    def test_success(self):
+        self.assertEqual(self.create()['id'], 'order_1')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_bad_request_does_not_trip_the_breaker(self):
+        error = {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'amount is invalid'}}
+        self.server.responses = [(400, error, 0)] * 3
+        for _ in range(3):
+            with self.assertRaises(razorpay.errors.BadRequestError):
+                self.create()
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_timeout_is_unavailable(self):
+        self.server.responses = [(200, {}, 1)]
+        start = time.monotonic()
+        with self.assertRaises(GatewayUnavailable):
+            self.create()
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_open_circuit_fails_fast(self):
+        self.server.responses = [(500, {'error': {'code': 'SERVER_ERROR'}}, 0)] * 2
+        for _ in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                self.create()
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(GatewayUnavailable):
+            self.create()
+        self.assertEqual(self.server.calls, 2)
+
+    def test_half_open_recovery(self):
+        self.server.responses = [(502, {'error': {'code': 'GATEWAY_ERROR'}}, 0)] * 3
+        for _ in range(2):
+            with self.assertRaises(GatewayUnavailable):
+                self.create()
+        time.sleep(0.25)
+        self.assertEqual(self.breaker.state, 'half-open')
+        # A failed trial call re-opens the circuit
+        with self.assertRaises(GatewayUnavailable):
+            self.create()
+        self.assertEqual(self.breaker.state, 'open')
+        time.sleep(0.25)
+        self.assertEqual(self.create()['id'], 'order_1')
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.server.calls, 4)
+
+    def test_unexpected_error_ends_the_trial_call(self):
+        self.breaker.failure_threshold = 1
+        self.server.responses = [(500, {'error': {'code': 'SERVER_ERROR'}}, 0), (500, 5, 0)]
+        with self.assertRaises(GatewayUnavailable):
+            self.create()
+        time.sleep(0.25)
+        # razorpay raises TypeError on a non-object error body
+        with self.assertRaises(TypeError):
+            self.create()
+        time.sleep(0.25)
+        self.assertEqual(self.create()['id'], 'order_1')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    async def test_async_create_order_runs_off_the_event_loop(self):
+        gateway = AsyncPaymentGateway(self.gateway)
+        self.server.responses = [(200, {'id': 'order_1'}, 0.2), (200, {'id': 'order_2'}, 0.2)]
+        start = time.monotonic()
+        orders = await asyncio.gather(*(gateway.create_order({'amount': 50000, 'currency': 'INR'}) for _ in range(2)))
+        # Both calls waited on the gateway at the same time
+        self.assertLess(time.monotonic() - start, 0.35)
+        self.assertEqual(sorted(order['id'] for order in orders), ['order_1', 'order_2'])
+
+    async def test_async_open_circuit_fails_fast(self):
+        gateway = AsyncPaymentGateway(self.gateway)
+        self.server.responses = [(500, {'error': {'code': 'SERVER_ERROR'}}, 0)] * 2
+        for _ in range(3):
+            with self.assertRaises(GatewayUnavailable):
+                await gateway.create_order({'amount': 50000, 'currency': 'INR'})
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.server.calls, 2)
+
+    def test_async_signature_checks(self):
+        gateway = AsyncPaymentGateway(self.gateway)
+        body = '{"event": "payment.captured"}'
+        signature = hmac.new(b'webhook-secret', body.encode(), hashlib.sha256).hexdigest()
+        self.assertTrue(gateway.verify_webhook_signature(body, signature, 'webhook-secret'))
+        with self.assertRaises(razorpay.errors.SignatureVerificationError):
+            gateway.verify_webhook_signature(body, '0' * 64, 'webhook-secret')
+
+
+class StubGateway:
+    """
+    Counts create_order calls; `on_call` runs inside the call, `error` is raised by it.
+    fetch_order_payments answers from `order_payments`: attempts, or an exception to raise.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.on_call = None
+        self.error = None
+        self.order_payments = {}
+        self.fetched = []
+
+    def create_order(self, data):
+        self.calls += 1
+        if self.on_call:
+            self.on_call()
+        if self.error:
+            raise self.error
+        return {'id': f'order_{self.calls}', 'amount': data['amount'], 'status': 'created'}
+
+    def fetch_order_payments(self, order_id):
+        self.fetched.append(order_id)
+        if self.on_call:
+            self.on_call(order_id)
+        answer = self.order_payments.get(order_id, [])
+        if isinstance(answer, Exception):
+            raise answer
+        return {'entity': 'collection', 'count': len(answer), 'items': answer}
+
+
+def reconcile_gateway():
+    return ReconcilePaymentsTests.gateway
+
+
+class ReconcilePaymentsTests(TransactionTestCase):
+    gateway = None
+
+    def setUp(self):
+        cache.clear()
+        ReconcilePaymentsTests.gateway = StubGateway()
+        created_at = timezone.now() - timedelta(hours=1)
+        self.payments = [
+            Payment.objects.create(order_id=f'order_{index}', amount=500, status='created') for index in range(4)
+        ]
+        Payment.objects.update(created_at=created_at)
+
+    def reconcile(self, *args):
+        output = io.StringIO()
+        call_command(
+            'reconcile_payments', '--gateway', 'ecomapp.tests.reconcile_gateway', '--workers', '1', *args, stdout=output,
+        )
+        return output.getvalue()
+
+    def statuses(self):
+        return dict(Payment.objects.values_list('order_id', 'status'))
+
+    def test_outcomes(self):
+        self.gateway.order_payments = {
+            'order_0': [{'id': 'pay_1', 'status': 'failed'}, {'id': 'pay_2', 'status': 'captured'}],
+            'order_1': [{'id': 'pay_3', 'status': 'failed'}],
+            'order_2': [{'id': 'pay_4', 'status': 'authorized'}],
+            'order_3': GatewayUnavailable('down'),
+        }
+        output = self.reconcile()
+        self.assertIn('1 paid, 1 failed, 1 unchanged, 1 gateway errors.', output)
+        self.assertEqual(self.statuses(), {'order_0': 'paid', 'order_1': 'failed', 'order_2': 'created', 'order_3': 'created'})
+        self.assertEqual(Payment.objects.get(order_id='order_0').payment_id, 'pay_2')
+
+    def test_recent_payments_are_skipped(self):
+        Payment.objects.filter(order_id='order_3').update(created_at=timezone.now())
+        self.reconcile()
+        self.assertEqual(self.gateway.fetched, ['order_0', 'order_1', 'order_2'])
+
+    def test_concurrent_verify_wins(self):
+        self.gateway.order_payments = {'order_0': [{'id': 'pay_1', 'status': 'failed'}]}
+
+        def verified_meanwhile(order_id):
+            if order_id == 'order_0':
+                Payment.objects.filter(order_id=order_id).update(status='paid', payment_id='pay_9')
+        self.gateway.on_call = verified_meanwhile
+
+        self.reconcile()
+        payment = Payment.objects.get(order_id='order_0')
+        self.assertEqual((payment.status, payment.payment_id), ('paid', 'pay_9'))
+
+    def test_whole_chunk_of_errors_aborts_and_resumes(self):
+        self.gateway.order_payments = {
+            'order_0': [{'id': 'pay_1', 'status': 'captured'}],
+            'order_2': GatewayUnavailable('down'),
+            'order_3': GatewayUnavailable('down'),
+        }
+        with self.assertRaisesMessage(CommandError, f'stopped after payment {self.payments[1].pk}'):
+            self.reconcile('--chunk-size', '2', '--restart')
+        self.assertEqual(self.statuses()['order_0'], 'paid')
+
+        # The next run starts after the last finished chunk
+        self.gateway.order_payments = {'order_2': [{'id': 'pay_2', 'status': 'captured'}]}
+        self.gateway.fetched = []
+        self.reconcile('--chunk-size', '2')
+        self.assertEqual(self.gateway.fetched, ['order_2', 'order_3'])
+        self.assertEqual(self.statuses()['order_2'], 'paid')
+        self.assertIsNone(cache.get('reconcile_payments:last_id'))
+
+
+class IdempotencyTests(CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.gateway = StubGateway()
+        previous, payments._gateway = payments._gateway, self.gateway
+        self.addCleanup(setattr, payments, '_gateway', previous)
+
+    def create_order(self, key='key-1', amount=500):
+        return self.client.post('/create-order/', {'amount': amount, 'employee_id': self.employee.pk}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_replayed_without_calling_the_gateway(self):
+        first = self.create_order()
+        self.assertEqual(first.status_code, 201)
+        retry = self.create_order()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(self.gateway.calls, 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        # Another key is another order
+        self.assertEqual(self.create_order(key='key-2').data['order']['id'], 'order_2')
+
+    def test_concurrent_retry_gets_409(self):
+        responses = []
+        self.gateway.on_call = lambda: responses.append(self.create_order())
+        self.assertEqual(self.create_order().status_code, 201)
+        self.assertEqual(responses[0].status_code, 409)
+        self.assertEqual(self.gateway.calls, 1)
+
+    def test_different_body_gets_422(self):
+        self.create_order(amount=500)
+        response = self.create_order(amount=900)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.gateway.calls, 1)
+
+    def test_server_errors_are_not_stored(self):
+        self.gateway.error = GatewayUnavailable('down')
+        self.assertEqual(self.create_order().status_code, 503)
+        self.gateway.error = None
+        response = self.create_order()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(self.gateway.calls, 2)
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='webhook-secret')
+class PaymentWebhookTests(TestCase):
+    def deliver(self, body, event_id='evt_1'):
+        body = body if isinstance(body, str) else json.dumps(body)
+        signature = hmac.new(b'webhook-secret', body.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            '/payments/webhook/', body, content_type='application/json',
+            HTTP_X_RAZORPAY_SIGNATURE=signature, HTTP_X_RAZORPAY_EVENT_ID=event_id,
+        )
+
+    def captured(self, order_id, payment_id='pay_1'):
+        return {'event': 'payment.captured', 'created_at': 1700000000,
+                'payload': {'payment': {'entity': {'id': payment_id, 'order_id': order_id}}}}
+
+    def test_malformed_payloads_are_rejected(self):
+        bodies = [
+            [1], 'null', '"text"', {'event': ['payment.captured']},
+            {'event': 'payment.captured', 'payload': None},
+            {'event': 'payment.captured', 'payload': {'payment': []}},
+            {'event': 'payment.captured', 'payload': {'payment': {'entity': {'order_id': 5}}}},
+            {**self.captured('order_1'), 'created_at': 'yesterday'},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(self.deliver(body).status_code, 400)
+        self.assertFalse(PaymentEvent.objects.exists())
+
+    def test_unknown_event_is_ignored(self):
+        response = self.deliver({'event': 'refund.created', 'payload': None})
+        self.assertEqual(response.data, {'status': 'ignored'})
+
+    def test_event_is_applied_once(self):
+        Payment.objects.create(order_id='order_1', amount=500, status='created')
+        self.assertEqual(self.deliver(self.captured('order_1')).data, {'status': 'accepted'})
+        self.assertEqual(self.deliver(self.captured('order_1')).status_code, 200)
+        self.assertEqual(apply_payment_events(), (1, 1, 0, 0))
+        payment = Payment.objects.get()
+        self.assertEqual((payment.status, payment.payment_id), ('paid', 'pay_1'))
+
+    def test_event_before_its_order_is_kept(self):
+        self.deliver(self.captured('order_2'))
+        self.assertEqual(apply_payment_events(), (1, 0, 1, 0))
+        event = PaymentEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(apply_payment_events(), (0, 0, 0, 0))
+
+        Payment.objects.create(order_id='order_2', amount=500, status='created')
+        PaymentEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(apply_payment_events(), (1, 1, 0, 0))
+        self.assertEqual(Payment.objects.get().status, 'paid')
+        self.assertIsNotNone(PaymentEvent.objects.get().processed_at)
+
+    def test_orphan_is_dead_lettered_after_max_attempts(self):
+        self.deliver(self.captured('order_3'))
+        PaymentEvent.objects.update(attempts=ORPHAN_MAX_ATTEMPTS - 2)
+        self.assertEqual(apply_payment_events(), (1, 0, 1, 0))
+        PaymentEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(apply_payment_events(), (1, 0, 0, 1))
+        event = PaymentEvent.objects.get()
+        self.assertTrue(event.dead_lettered)
+        self.assertIsNotNone(event.processed_at)
+        # Off the queue for good, even once the order exists
+        Payment.objects.create(order_id='order_3', amount=500, status='created')
+        PaymentEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(apply_payment_events(), (0, 0, 0, 0))
+        self.assertEqual(Payment.objects.get().status, 'created')
+
+    def test_purge_keeps_recent_pending_and_dead_events(self):
+        old = timezone.now() - timedelta(days=8)
+        for index, (processed_at, dead_lettered) in enumerate([(old, False), (old, True), (None, False), (timezone.now(), False)]):
+            PaymentEvent.objects.create(
+                event_id=f'evt_{index}', event='payment.captured', order_id='order_1', status='paid',
+                occurred_at=old, processed_at=processed_at, dead_lettered=dead_lettered,
+            )
+        output = io.StringIO()
+        call_command('purge_payment_events', '--days', '7', '--batch-size', '1', stdout=output)
+        self.assertIn('Purged 1 applied payment events.', output.getvalue())
+        self.assertEqual(sorted(PaymentEvent.objects.values_list('event_id', flat=True)), ['evt_1', 'evt_2', 'evt_3'])
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """Every endpoint within its query_budget, and no query count growing with the data."""
+
+    def test_query_budgets(self):
+        output = io.StringIO()
+        try:
+            call_command('check_query_budgets', '--no-create-db', stdout=output)
+        except CommandError as exc:
+            self.fail(f"{exc}\n{output.getvalue()}")
+        self.assertIn('Every endpoint is within its query budget.', output.getvalue())
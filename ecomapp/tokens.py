@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_to_epoch
+
+
+def blacklist_key(jti):
+    return f"jwt:blacklist:{jti}"
+
+
+def blacklist_jti(jti, exp):
+    """Revoke a token id until its own expiry; already expired tokens need no entry."""
+    ttl = exp - datetime_to_epoch(aware_utcnow())
+    if ttl > 0:
+        cache.set(blacklist_key(jti), 1, ttl)
+
+
+class RedisRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist is kept in the cache instead of the
+    token_blacklist tables: a revoked jti is one key that expires together
+    with the token, and issuing a token writes no OutstandingToken row.
+    """
+
+    def check_blacklist(self):
+        if cache.get(blacklist_key(self.payload[api_settings.JTI_CLAIM])) is not None:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        blacklist_jti(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+    @classmethod
+    def for_user(cls, user):
+        # Skip BlacklistMixin.for_user, which records an OutstandingToken
+        return super(BlacklistMixin, cls).for_user(user)
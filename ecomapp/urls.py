@@ -1,21 +1,29 @@
 from django.urls import path
-from .views import RegisterAPIView,LoginAPIView,OTPVerificationAPIView,ProfileCreateView,LogoutAPIView,ServicesAPIView,ServiceRegistryView,ServiceRequestAPIView,BookingListView,ReviewAPIView,CreateOrderAPIView, VerifyPaymentAPIView
-from rest_framework_simplejwt.views import TokenObtainPairView,TokenRefreshView 
+from .views import RegisterAPIView,TokenObtainView,TokenRefreshAPIView,LoginAPIView,OTPVerificationAPIView,ProfileCreateView,LogoutAPIView,ServicesAPIView,ServiceRegistryView,SearchAPIView,ServiceRequestAPIView,ServiceRequestBulkAPIView,SlotCheckAPIView,ProviderAvailabilityAPIView,BookingListView,MyBookingListView,ReviewAPIView,ListingReviewsAPIView,CreateOrderAPIView, VerifyPaymentAPIView, PaymentWebhookAPIView, metrics
 
 urlpatterns = [
     path('register/', RegisterAPIView.as_view(), name='register'),
     path('login/', LoginAPIView.as_view(), name='login'),
     path('verify-otp/', OTPVerificationAPIView.as_view(), name='verify-otp'),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/', TokenObtainView.as_view(), name='token_obtain_pair'),
+    path('token/refresh/', TokenRefreshAPIView.as_view(), name='token_refresh'),
     path('profile/', ProfileCreateView.as_view(), name='profile-create'),
     path('logout/', LogoutAPIView.as_view(), name='logout'),
     path('services/', ServicesAPIView.as_view(), name='services'),
     path('service-registry/', ServiceRegistryView.as_view(), name='service-registry'),
+    path('search/', SearchAPIView.as_view(), name='search'),
+    path('service-registry/<int:pk>/reviews/', ListingReviewsAPIView.as_view(), name='listing-reviews'),
+    path('service-registry/<int:registry_id>/availability/', ProviderAvailabilityAPIView.as_view(), name='listing-availability'),
+    path('providers/<int:employee_id>/availability/', ProviderAvailabilityAPIView.as_view(), name='provider-availability'),
     path('service-requests/', ServiceRequestAPIView.as_view(), name='service-request-list'), 
     path('service-requests/<int:pk>/', ServiceRequestAPIView.as_view(), name='service-request-detail'), 
+    path('service-requests/bulk/', ServiceRequestBulkAPIView.as_view(), name='service-request-bulk'),
+    path('service-requests/check-slots/', SlotCheckAPIView.as_view(), name='service-request-check-slots'),
     path('bookings/', BookingListView.as_view(), name='booking-list'),
+    path('bookings/me/', MyBookingListView.as_view(), name='my-booking-list'),
     path('reviews/', ReviewAPIView.as_view(), name='reviews'),
     path('create-order/', CreateOrderAPIView.as_view(), name='create-order'),
     path('verify-payment/', VerifyPaymentAPIView.as_view(), name='verify-payment'),
+    path('payments/webhook/', PaymentWebhookAPIView.as_view(), name='payment-webhook'),
+    path('metrics', metrics, name='metrics'),
 ]
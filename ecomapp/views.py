@@ -1,32 +1,39 @@
 from rest_framework.views import APIView
-from .serializers import RegisterSerializer,OTPVerificationSerializer,ProfileSerializer, ServicesSerializer, SubservicesSerializer, ServiceRegistrySerializer, ServiceRequestSerializer, BookingListSerializer,ReviewSerializer,CreateOrderSerializer, VerifyPaymentSerializer, PaymentSerializer
+from .serializers import RegisterSerializer,OTPVerificationSerializer,ProfileSerializer, ServicesSerializer, SubservicesSerializer, ServiceRegistrySerializer, ServiceRequestSerializer, BookingListSerializer,MyBookingSerializer,ReviewSerializer,ListingReviewSerializer,RatingSummarySerializer,SlotCheckSerializer,AvailabilityQuerySerializer,ServiceRegistryQuerySerializer,SearchQuerySerializer,BulkServiceRequestItemSerializer,CreateOrderSerializer, VerifyPaymentSerializer, PaymentSerializer, ValuesSerializer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from .manager import create_otp_for_user
-from .email import send_otp_via_email
+from .email import enqueue_otp_email
 from django.contrib.auth.hashers import check_password
-from .models import Register,Profile,Services, Subservices, ServiceRegistry, ServiceRequest,BookingList,Review,Payment,EmployeeRegistration
-from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Register,Profile,Services, Subservices, ServiceRegistry, ServiceRequest,BookingList,Review,Payment,EmployeeRegistration,RatingSummary
+from .tokens import RedisRefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import ListAPIView
 from rest_framework.decorators import api_view
-from .pagination import CustomPagination
+from .pagination import KeysetPagination
+from .listings import listing_keys, listing_pagination
+from .search import search
+from .cache import availability_namespace, bump_version, get_or_build_catalog
+from .payments import GatewayUnavailable, get_gateway
+from .idempotency import idempotent
+from .webhooks import InvalidPaymentEvent, record_payment_event
+from .metrics import render_metrics
+from .booking import BookingConflict, find_conflicts, free_slots, lock_providers, save_request
 from django.http import HttpResponse
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_headers
 from django.conf import settings
+from django.db import transaction
 from rest_framework.response import Response
 import razorpay   
 import uuid    
+import json
 
 
 
-client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
-
 class CreateOrderAPIView(APIView):
+    query_budget = 2
+    @idempotent
     def post(self, request):
         serializer = CreateOrderSerializer(data=request.data)
         if serializer.is_valid():
@@ -41,7 +48,13 @@ class CreateOrderAPIView(APIView):
                 "payment_capture": 1
             }
 
-            order = client.order.create(data)
+            try:
+                order = get_gateway().create_order(data)
+            except GatewayUnavailable as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            except razorpay.errors.BadRequestError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
             payment = Payment.objects.create(
                 order_id=order["id"], 
                 user=user,
@@ -58,6 +71,8 @@ class CreateOrderAPIView(APIView):
 
 
 class VerifyPaymentAPIView(APIView):
+    query_budget = 2
+    @idempotent
     def post(self, request):
         serializer = VerifyPaymentSerializer(data=request.data)
         if serializer.is_valid():
@@ -72,14 +87,10 @@ class VerifyPaymentAPIView(APIView):
             }
 
             try:
-                client.utility.verify_payment_signature(params_dict)
+                get_gateway().verify_payment_signature(params_dict)
                 
                 # Update Payment record
-                payment = Payment.objects.filter(order_id=order_id).first()
-                if payment:
-                    payment.payment_id = payment_id
-                    payment.status = "paid"
-                    payment.save()
+                Payment.objects.filter(order_id=order_id).update(payment_id=payment_id, status="paid")
 
                 return Response({"message": "Payment successful"}, status=status.HTTP_200_OK)
             except razorpay.errors.SignatureVerificationError:
@@ -90,6 +101,42 @@ class VerifyPaymentAPIView(APIView):
 
 
 
+class PaymentWebhookAPIView(APIView):
+    """Razorpay webhook: verify, de-duplicate and queue the event; apply_payment_events writes it."""
+    query_budget = 3
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        body = request.body.decode('utf-8')
+        signature = request.META.get('HTTP_X_RAZORPAY_SIGNATURE', '')
+        event_id = request.META.get('HTTP_X_RAZORPAY_EVENT_ID', '')
+        if not settings.RAZORPAY_WEBHOOK_SECRET or not signature or not event_id:
+            return Response({"error": "Missing webhook signature or event id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            get_gateway().verify_webhook_signature(body, signature, settings.RAZORPAY_WEBHOOK_SECRET)
+        except razorpay.errors.SignatureVerificationError:
+            return Response({"error": "Invalid webhook signature."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return Response({"error": "Invalid JSON payload."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            accepted = record_payment_event(event_id, payload)
+        except InvalidPaymentEvent as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"status": "accepted" if accepted else "ignored"}, status=status.HTTP_200_OK)
+
+
+def metrics(request):
+    """Prometheus scrape target; the numbers are per worker process."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
     
 def welcome(request):
     content = """
@@ -135,6 +182,7 @@ def welcome(request):
     
     
 class RegisterAPIView(APIView):
+    query_budget = 3
     permission_classes=[AllowAny]
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
@@ -144,6 +192,7 @@ class RegisterAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) 
 
 class LoginAPIView(APIView):
+    query_budget = 3
     permission_classes=[IsAuthenticated] 
     def post(self, request):
         email = request.data.get('email')
@@ -157,7 +206,7 @@ class LoginAPIView(APIView):
             if check_password(password, user.password):
                 otp_code = create_otp_for_user(user)
 
-                send_otp_via_email(email, otp_code)   
+                enqueue_otp_email(email, otp_code)  # Delivered by `manage.py send_outbox`
         
                 return Response({"message": "Login successful check your mail", "user": {"id": user.id, "name": user.name, "email": user.email}}, status=status.HTTP_200_OK)
             else:
@@ -166,14 +215,15 @@ class LoginAPIView(APIView):
             return Response({"error": "Invalid email or password."}, status=status.HTTP_401_UNAUTHORIZED)  
 
 class OTPVerificationAPIView(APIView):
+    query_budget = 1
     def post(self, request):
         serializer = OTPVerificationSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()  # Delete OTP after successful verification
+        if serializer.is_valid():  # The OTP is consumed while validating
             return Response({"message": "OTP verified successfully."}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 class ProfileCreateView(APIView):
+    query_budget = {'GET': 2, 'POST': 4, 'PUT': 4, 'PATCH': 3, 'DELETE': 3}
     permission_classes = [IsAuthenticated]  
 
     def get(self, request):
@@ -238,7 +288,16 @@ class ProfileCreateView(APIView):
 
     
 
+class TokenObtainView(TokenObtainPairView):
+    query_budget = 1
+
+
+class TokenRefreshAPIView(TokenRefreshView):
+    query_budget = 1
+
+
 class LogoutAPIView(APIView):
+    query_budget = 1
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -248,7 +307,7 @@ class LogoutAPIView(APIView):
                 return Response({"error": "Refresh token is required."}, status=status.HTTP_400_BAD_REQUEST)
             
             # Blacklist the refresh token
-            token = RefreshToken(refresh_token)
+            token = RedisRefreshToken(refresh_token)
             token.blacklist()
             
             return Response({"message": "Successfully logged out."}, status=status.HTTP_200_OK)
@@ -259,17 +318,21 @@ class LogoutAPIView(APIView):
         
         
 class ServicesAPIView(APIView):
-    
-    @method_decorator(cache_page(60 * 60))
-    @method_decorator(vary_on_headers('Authorization'))
+    query_budget = 3
+
     def get(self, request):
-    
-        services = Services.objects.all()
+        # The catalog is identical for every user, so it is cached once and
+        # invalidated by the Services/Subservices signals instead of a timeout.
+        data = get_or_build_catalog(self.build_catalog)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def build_catalog():
+        services = Services.objects.prefetch_related('subservices')
         data = []
 
         for service in services:
-            subservices = service.subservices.all() 
-            subservices_serializer = SubservicesSerializer(subservices, many=True)
+            subservices_serializer = SubservicesSerializer(service.subservices.all(), many=True)
             service_data = {
                 "id": service.id,
                 "title": service.title,
@@ -280,7 +343,7 @@ class ServicesAPIView(APIView):
             }
             data.append(service_data)
 
-        return Response(data, status=status.HTTP_200_OK)
+        return data
     
     
     
@@ -288,22 +351,48 @@ class ServicesAPIView(APIView):
     
     
 class ServiceRegistryView(APIView):
-    
+    query_budget = 4  # The rating sort page where rated listings run out reads the unrated ones too
+    values_serializer = ValuesSerializer(ServiceRegistrySerializer)
+
     def get(self, request):
-      
-        service_registries = ServiceRegistry.objects.all()
-        serializer = ServiceRegistrySerializer(service_registries, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        serializer = ServiceRegistryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        # Page through (id, sort key) pairs on the covering indexes, then
+        # load the full rows of that page only
+        paginator = listing_pagination(serializer.validated_data)
+        page = paginator.paginate_queryset(listing_keys(serializer.validated_data), request, view=self)
+        ids = [row['id'] for row in page]
+        rows = {row['id']: row for row in self.values_serializer.values(ServiceRegistry.objects.filter(pk__in=ids))}
+        data = self.values_serializer.to_representation(rows[pk] for pk in ids if pk in rows)
+        return paginator.get_paginated_response(data)
+    
+    
     
     
     
     
     
     
+class SearchAPIView(APIView):
+    query_budget = 2
+
+    def get(self, request):
+        serializer = SearchQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data['q']
+        results = search(query, limit=serializer.validated_data['limit'])
+        return Response({'query': query, 'results': results}, status=status.HTTP_200_OK)
+    
+    
+    
+    
     
     
 class ServiceRequestAPIView(APIView):
+    query_budget = {'GET': 2, 'POST': 10, 'PUT': 10, 'PATCH': 9, 'DELETE': 6}
     permission_classes = [IsAuthenticated] 
+    values_serializer = ValuesSerializer(ServiceRequestSerializer)
 
     def get(self, request, pk=None):
     
@@ -315,22 +404,23 @@ class ServiceRequestAPIView(APIView):
             except ServiceRequest.DoesNotExist:
                 return Response({"error": "ServiceRequest not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # If no `pk` is provided, return all service requests
-        service_requests = ServiceRequest.objects.all()
-        serializer = ServiceRequestSerializer(service_requests, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # If no `pk` is provided, return all service requests, one page at a time
+        service_requests = self.values_serializer.values(ServiceRequest.objects.all())
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        page = paginator.paginate_queryset(service_requests, request, view=self)
+        return paginator.get_paginated_response(self.values_serializer.to_representation(page))
 
     def post(self, request):
    
         
-        data = request.data.copy()  
-        data['register'] = request.user.id  
-        
         # Serialize the data
-        serializer = ServiceRequestSerializer(data=data)
+        serializer = ServiceRequestSerializer(data=request.data)
         
         if serializer.is_valid():
-            serializer.save()  # Save the new service request
+            try:
+                save_request(serializer, register=request.user)  # Owner comes from the token, no Register lookup
+            except BookingConflict as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -344,7 +434,10 @@ class ServiceRequestAPIView(APIView):
 
         serializer = ServiceRequestSerializer(service_request, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                save_request(serializer)
+            except BookingConflict as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -357,7 +450,10 @@ class ServiceRequestAPIView(APIView):
 
         serializer = ServiceRequestSerializer(service_request, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                save_request(serializer)
+            except BookingConflict as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -373,18 +469,175 @@ class ServiceRequestAPIView(APIView):
     
     
     
+class ServiceRequestBulkAPIView(APIView):
+    query_budget = 8
+    permission_classes = [IsAuthenticated]
+    max_items = 100
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Expected a non-empty list of service requests."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response({"error": f"At most {self.max_items} service requests can be submitted at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = {}
+        candidates = []
+        for index, item in enumerate(items):
+            serializer = BulkServiceRequestItemSerializer(data=item)
+            if serializer.is_valid():
+                candidates.append((index, serializer.validated_data))
+            else:
+                errors[index] = serializer.errors
+
+        providers = dict(
+            ServiceRegistry.objects.filter(pk__in={data['service_registry'] for _, data in candidates}).values_list('pk', 'employee_id')
+        )
+        for index, data in candidates:
+            if data['service_registry'] not in providers:
+                errors[index] = {"service_registry": ["ServiceRegistry not found."]}
+        candidates = [(index, data) for index, data in candidates if index not in errors]
+
+        with transaction.atomic():
+            employee_ids = {providers[data['service_registry']] for _, data in candidates}
+            lock_providers(employee_ids)
+            conflicts = find_conflicts([
+                (providers[data['service_registry']], data['from_time'], data['to_time']) for _, data in candidates
+            ])
+
+            accepted = []
+            for (index, data), conflict in zip(candidates, conflicts):
+                employee_id = providers[data['service_registry']]
+                # Overlaps with existing requests, then with earlier items of this batch
+                if conflict or any(
+                    other.employee_id == employee_id and other.from_time < data['to_time'] and other.to_time > data['from_time']
+                    for other in accepted
+                ):
+                    errors[index] = {"error": "The provider is already booked in this time window."}
+                    continue
+                accepted.append(ServiceRequest(
+                    service_registry_id=data['service_registry'],
+                    employee_id=employee_id,
+                    register=request.user,
+                    title=data['title'],
+                    description=data['description'],
+                    from_time=data['from_time'],
+                    to_time=data['to_time'],
+                ))
+
+            # bulk_create skips the post_save receivers, so bookings and cache
+            # invalidation (after commit) are done here for the whole batch
+            created = ServiceRequest.objects.bulk_create(accepted)
+            BookingList.objects.bulk_create([
+                BookingList(register=request.user, booking_date=service_request.created_at, service_request=service_request)
+                for service_request in created
+            ])
+            for employee_id in {service_request.employee_id for service_request in created}:
+                transaction.on_commit(lambda employee_id=employee_id: bump_version(availability_namespace(employee_id)))
+
+        return Response({
+            "created": ServiceRequestSerializer(created, many=True).data,
+            "errors": [{"index": index, "errors": errors[index]} for index in sorted(errors)],
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
+class SlotCheckAPIView(APIView):
+    query_budget = 3
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = SlotCheckSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        slots = serializer.validated_data['slots']
+        providers = dict(
+            ServiceRegistry.objects.filter(pk__in={slot['service_registry'] for slot in slots}).values_list('pk', 'employee_id')
+        )
+        known = [slot for slot in slots if slot['service_registry'] in providers]
+        conflicts = iter(find_conflicts([
+            (providers[slot['service_registry']], slot['from_time'], slot['to_time']) for slot in known
+        ]))
+
+        results = []
+        for slot in slots:
+            result = dict(slot)
+            if slot['service_registry'] in providers:
+                result['conflicts'] = next(conflicts)
+                result['available'] = not result['conflicts']
+            else:
+                result['available'] = False
+                result['error'] = "ServiceRegistry not found."
+            results.append(result)
+        return Response({"slots": results}, status=status.HTTP_200_OK)
+
+
+class ProviderAvailabilityAPIView(APIView):
+    """Free slots of a provider, addressed by employee or by one of its listings."""
+    query_budget = 3
+
+    def get(self, request, employee_id=None, registry_id=None):
+        serializer = AvailabilityQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if registry_id is not None:
+            employee_id = ServiceRegistry.objects.filter(pk=registry_id).values_list('employee_id', flat=True).first()
+            if employee_id is None:
+                return Response({"error": "ServiceRegistry not found."}, status=status.HTTP_404_NOT_FOUND)
+        elif not EmployeeRegistration.objects.filter(pk=employee_id).exists():
+            return Response({"error": "Employee not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        params = serializer.validated_data
+        days = free_slots(employee_id, params['start'], params['end'], params['slot'])
+        return Response({
+            "employee": employee_id,
+            "slot_minutes": params['slot'],
+            "days": [
+                {"date": day, "slots": [{"from_time": start, "to_time": end} for start, end in slots]}
+                for day, slots in days
+            ],
+        }, status=status.HTTP_200_OK)
+
+
 class BookingListView(APIView):
+    query_budget = 2
+    values_serializer = ValuesSerializer(BookingListSerializer)
+
     def get(self, request):
-        bookings = BookingList.objects.select_related('register', 'service_request').all()
-        paginator = CustomPagination()
+        bookings = self.values_serializer.values(BookingList.objects.all())
+        paginator = KeysetPagination(ordering=('-booking_date', '-id'))
         paginated_queryset = paginator.paginate_queryset(bookings, request, view=self)
-        serializer = BookingListSerializer(paginated_queryset, many=True)
+        return paginator.get_paginated_response(self.values_serializer.to_representation(paginated_queryset))
+
+
+class MyBookingListView(APIView):
+    query_budget = 2
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Range scan on (register, booking_date) with the row payload joined in
+        bookings = BookingList.objects.filter(register=request.user).values(
+            'id',
+            'booking_date',
+            'service_request_id',
+            'service_request__title',
+            'service_request__service_registry__service__title',
+            'service_request__service_registry__employee__name',
+            'service_request__from_time',
+            'service_request__to_time',
+        )
+        paginator = KeysetPagination(ordering=('-booking_date', '-id'))
+        page = paginator.paginate_queryset(bookings, request, view=self)
+        serializer = MyBookingSerializer(page, many=True)
         return paginator.get_paginated_response(serializer.data)
 
 
 
 
 class ReviewAPIView(APIView):
+    query_budget = {'GET': 2, 'POST': 13}  # POST: +2 when the listing's first rating summary row is created
+    values_serializer = ValuesSerializer(ReviewSerializer)
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -392,14 +645,38 @@ class ReviewAPIView(APIView):
         return [AllowAny()]  # Everyone can read reviews
 
     def get(self, request):
-        reviews = Review.objects.select_related('service').all()  # Optimize query
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        reviews = self.values_serializer.values(Review.objects.all())  # Joins the nested registry in one query
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        return paginator.get_paginated_response(self.values_serializer.to_representation(page))
 
     def post(self, request):
         serializer = ReviewSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(user=request.user)  # Assign logged-in user
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            with transaction.atomic():  # Review row and rating summary commit together
+                review = serializer.save(user=request.user)  # Assign logged-in user
+            # Reload with the nested registry joined instead of one query per relation
+            review = Review.objects.select_related('service__employee', 'service__service', 'service__rating_summary').get(pk=review.pk)
+            return Response(ReviewSerializer(review).data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ListingReviewsAPIView(APIView):
+    query_budget = 3
+    permission_classes = [AllowAny]
+    values_serializer = ValuesSerializer(ListingReviewSerializer)
+
+    def get(self, request, pk):
+        summary = RatingSummary.objects.filter(listing_id=pk).first()
+        if summary is None:
+            if not ServiceRegistry.objects.filter(pk=pk).exists():
+                return Response({"error": "ServiceRegistry not found."}, status=status.HTTP_404_NOT_FOUND)
+            summary = RatingSummary(listing_id=pk)
+
+        reviews = self.values_serializer.values(Review.objects.filter(service_id=pk))
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        response = paginator.get_paginated_response(self.values_serializer.to_representation(page))
+        response.data['rating_summary'] = RatingSummarySerializer(summary).data
+        return response
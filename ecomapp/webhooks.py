@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, PaymentEvent
+
+
+# Gateway events that settle a payment, and the status they move it to
+EVENT_STATUSES = {
+    'payment.captured': 'paid',
+    'order.paid': 'paid',
+    'payment.failed': 'failed',
+}
+
+ORPHAN_BACKOFF = 30
+ORPHAN_MAX_BACKOFF = 60 * 60
+ORPHAN_MAX_ATTEMPTS = 20  # About 14 hours of retries
+
+
+class InvalidPaymentEvent(ValueError):
+    """A correctly signed webhook body that is not a payment event we can read."""
+
+
+def record_payment_event(event_id, payload):
+    """
+    Append a verified webhook event to the queue. Redelivered events hit the
+    unique event_id and are dropped. Returns False for ignored event types,
+    raises InvalidPaymentEvent for a malformed payload.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('event'), str):
+        raise InvalidPaymentEvent("Webhook payload must be an object with an event name.")
+    status = EVENT_STATUSES.get(payload['event'])
+    if status is None:
+        return False
+    entity = payload.get('payload')
+    for key in ('payment', 'entity'):
+        entity = entity.get(key) if isinstance(entity, dict) else None
+    if not isinstance(entity, dict) or not isinstance(entity.get('order_id'), str) or not entity['order_id']:
+        raise InvalidPaymentEvent("Webhook payload has no payment entity with an order_id.")
+    payment_id = entity.get('id') or ''
+    created = payload.get('created_at')
+    if not isinstance(payment_id, str) or (created is not None and (isinstance(created, bool) or not isinstance(created, (int, float)))):
+        raise InvalidPaymentEvent("Webhook payload has an invalid payment id or created_at.")
+    PaymentEvent.objects.bulk_create([
+        PaymentEvent(
+            event_id=event_id,
+            event=payload['event'],
+            order_id=entity['order_id'],
+            payment_id=payment_id,
+            status=status,
+            occurred_at=datetime.fromtimestamp(created, tz=dt_timezone.utc) if created else timezone.now(),
+        )
+    ], ignore_conflicts=True)
+    return True
+
+
+def apply_payment_events(batch_size=1000):
+    """
+    Apply one batch of due events in a single transaction.
+
+    Events are replayed in the order they happened; only created -> paid and
+    created -> failed transitions are made, and a capture outranks a failed
+    attempt of the same order. Events whose order has no Payment row yet
+    (the webhook can beat the order's own commit) stay queued and are retried
+    with backoff, and are dead-lettered after ORPHAN_MAX_ATTEMPTS. Returns
+    (events in the batch, payments updated, events deferred, events dead-lettered).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not events:
+            return 0, 0, 0, 0
+
+        known = set(Payment.objects.filter(order_id__in={event.order_id for event in events}).values_list('order_id', flat=True))
+        orphans = [event for event in events if event.order_id not in known]
+        dead = []
+        for event in orphans:
+            event.attempts += 1
+            event.next_attempt_at = now + timedelta(seconds=min(ORPHAN_BACKOFF * 2 ** (event.attempts - 1), ORPHAN_MAX_BACKOFF))
+            if event.attempts >= ORPHAN_MAX_ATTEMPTS:
+                event.dead_lettered = True
+                event.processed_at = now
+                dead.append(event)
+        PaymentEvent.objects.bulk_update(orphans, ['attempts', 'next_attempt_at', 'dead_lettered', 'processed_at'])
+
+        outcomes = {}
+        for event in sorted(events, key=lambda event: (event.occurred_at, event.id)):
+            if event.order_id not in known:
+                continue
+            current = outcomes.get(event.order_id)
+            if current is None or current.status != 'paid':
+                outcomes[event.order_id] = event
+
+        payments = list(Payment.objects.select_for_update().filter(order_id__in=outcomes, status='created'))
+        for payment in payments:
+            event = outcomes[payment.order_id]
+            payment.status = event.status
+            payment.payment_id = event.payment_id or payment.payment_id
+        Payment.objects.filter(status='created').bulk_update(payments, ['status', 'payment_id'])
+
+        applied = [event.pk for event in events if event.order_id in known]
+        PaymentEvent.objects.filter(pk__in=applied).update(processed_at=now)
+    return len(events), len(payments), len(orphans) - len(dead), len(dead)
+
+
+def purge_payment_events(older_than, batch_size=5000):
+    """Delete applied events processed before `older_than`, one bounded batch at a time; dead letters are kept."""
+    # Old rows sit at the low end of the primary key, so each batch is found
+    # by a short primary key scan
+    applied = PaymentEvent.objects.filter(processed_at__lt=older_than, dead_lettered=False).order_by('id')
+    purged = 0
+    while True:
+        ids = list(applied.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        deleted, _ = PaymentEvent.objects.filter(id__in=ids).delete()
+        purged += deleted
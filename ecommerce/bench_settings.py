@@ -0,0 +1,35 @@
+"""
+Settings for `manage.py bench` and `manage.py loadtest`: SQLite, local-memory
+cache and e-mail, so neither needs PostgreSQL, Redis or SMTP.
+
+    python manage.py bench --settings=ecommerce.bench_settings
+"""
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'bench.sqlite3',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# ecomapp ships without migration files, create its tables straight from the models
+MIGRATION_MODULES = {'ecomapp': None}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'debug_toolbar']
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if 'debug_toolbar' not in middleware]
+
+# Covering indexes are PostgreSQL-only; SQLite builds them without INCLUDE
+SILENCED_SYSTEM_CHECKS = ['models.W040']
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecomapp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +57,9 @@ MIDDLEWARE = [
 ]
 
 
+# Clients allowed to scrape /metrics
+METRICS_ALLOWED_IPS = ["127.0.0.1"]
+
 INTERNAL_IPS = [
     # ...
     "127.0.0.1",
@@ -174,11 +178,15 @@ AUTH_USER_MODEL = 'ecomapp.Register'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'ecomapp.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Only authenticated users allowed
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'ecomapp.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -188,8 +196,17 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    # Revoked refresh tokens live in Redis until they expire, see ecomapp/tokens.py
+    'TOKEN_OBTAIN_SERIALIZER': 'ecomapp.serializers.RedisTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'ecomapp.serializers.RedisTokenRefreshSerializer',
 }
 
+# Authenticated users are cached per process for a few seconds and in Redis
+# for a minute; saving or deleting a Register row clears both.
+AUTH_USER_CACHE_LOCAL_TTL = 5
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_CACHE_MAX_ENTRIES = 1024
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'  
@@ -198,6 +215,16 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = ""  # Fetch from environment variable
 EMAIL_HOST_PASSWORD ="" 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER 
+EMAIL_TIMEOUT = 10  # Seconds per SMTP operation, so a stuck server cannot stall the outbox worker
+
+
+
+
+
+
+# Login OTPs: where codes are kept and how long they stay valid
+OTP_BACKEND = 'ecomapp.otp.CacheOTPBackend'  # or 'ecomapp.otp.DatabaseOTPBackend'
+OTP_TTL_SECONDS = 5 * 60
 
 
 
@@ -206,3 +233,17 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
 RAZORPAY_KEY_ID = ""
 RAZORPAY_KEY_SECRET = ""
+RAZORPAY_WEBHOOK_SECRET = ""
+RAZORPAY_BASE_URL = None  # Point at a local fake gateway in tests, None for the real API
+RAZORPAY_TIMEOUT = (3.05, 10)  # Connect and read timeouts, in seconds
+RAZORPAY_POOL_SIZE = 10
+RAZORPAY_BREAKER_THRESHOLD = 5  # Consecutive failures before the circuit opens
+RAZORPAY_BREAKER_RESET = 30  # Seconds before a trial call is let through
+
+
+
+
+# Provider availability calendar: working window of each day and longest range per request
+AVAILABILITY_DAY_START_HOUR = 9
+AVAILABILITY_DAY_END_HOUR = 18
+AVAILABILITY_MAX_DAYS = 31